@@ -1,29 +1,179 @@
 import json
 import logging
 import os
+import re
+import threading
+import time
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    as_completed,
+)
 from datetime import datetime
-from urllib.parse import quote
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import (
+    quote,
+    urljoin,
+)
 
 import requests
-from pythosf import client
+from pythosf import (
+    client,
+    exceptions,
+)
+from pythosf.utils import combine_headers
 
 import settings
 
 
 logger = logging.getLogger(__name__)
 
+# Api responses that are worth retrying, e.g. the api is temporarily overloaded
+RETRY_STATUS_CODES = (502, 503)
+# How many api requests to make at once when deleting many objects
+CLEANUP_WORKERS = 8
+# How many keep-alive connections each session keeps open per host
+POOL_MAXSIZE = 16
+
+
+class PooledSession(client.Session):
+    """A pythosf Session that sends its requests over keep-alive connections.
+
+    pythosf makes every request with a bare `requests.<method>` call, so each one
+    opens a new connection (and TLS handshake). This reimplements
+    `json_api_request` on top of a `requests.Session`. HTTP errors also keep their
+    response, so callers can check `exc.response.status_code`.
+
+    Sessions are used from several threads at once (e.g. concurrent cleanups), and a
+    `requests.Session` isn't thread-safe, so each thread gets its own. They share one
+    connection pool, and don't keep cookies, like the bare requests of pythosf.
+    """
+
+    def __init__(self, api_base_url, auth=None, default_version=None, config=None):
+        super().__init__(
+            api_base_url, auth=auth, default_version=default_version, config=config
+        )
+        self.adapter = requests.adapters.HTTPAdapter(pool_maxsize=POOL_MAXSIZE)
+        self._local = threading.local()
+
+    @property
+    def http(self):
+        """The `requests.Session` of the current thread."""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = requests.Session()
+            http.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            http.mount('https://', self.adapter)
+            http.mount('http://', self.adapter)
+            self._local.http = http
+        return http
+
+    def json_api_request(
+        self,
+        url,
+        method=None,
+        item_id=None,
+        item_type=None,
+        attributes=None,
+        raw_body=None,
+        query_parameters=None,
+        fields=None,
+        headers=None,
+        retry=True,
+        auth=None,
+    ):
+        method = method.upper() if method else method
+        if method not in ('GET', 'POST', 'PUT', 'PATCH', 'DELETE'):
+            raise exceptions.UnsupportedHTTPMethod(
+                'Only GET/POST/PUT/PATCH/DELETE supported, not {}'.format(method)
+            )
+        url = urljoin(self.api_base_url, url)
+
+        request_data = {}
+        if raw_body is None:
+            request_body = {}
+            if attributes is not None:
+                request_body['attributes'] = attributes
+            if item_id is not None:
+                request_body['id'] = item_id
+            if item_type is not None:
+                request_body['type'] = item_type
+            request_data['data'] = request_body
+        elif raw_body == '':
+            request_data = None
+            raw_body = None
+
+        query_parameters = dict(query_parameters or {})
+        if not query_parameters.get('version'):
+            query_parameters['version'] = self.default_version
+
+        kwargs = {
+            'params': query_parameters,
+            'headers': combine_headers(self.base_headers, headers),
+            'auth': auth or self.auth,
+        }
+        if method in ('POST', 'PUT', 'PATCH'):
+            kwargs.update(json=request_data, data=raw_body)
+
+        while True:
+            try:
+                response = self.http.request(method, url, **kwargs)
+                if response.status_code >= 400 and response.status_code != 429:
+                    raise requests.exceptions.HTTPError(
+                        'Status code {}. {}'.format(
+                            response.status_code, response.content
+                        ),
+                        response=response,
+                    )
+                self.request_count += 1
+            except requests.exceptions.RequestException as exc:
+                self.error_count += 1
+                logger.warning('HTTP Request failed: {}'.format(exc))
+                raise
+            if response.status_code == 429 and retry:
+                wait_time = response.headers['Retry-After']
+                logger.warning('Throttled: retrying in {}s'.format(wait_time))
+                time.sleep(int(wait_time))
+                continue
+            break
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(
+    user=settings.USER_ONE,
+    password=settings.USER_ONE_PASSWORD,
+    api_base_url=settings.API_DOMAIN,
+):
+    """Return the shared PooledSession for the given api domain and credentials,
+    creating it the first time it is asked for.
+    """
+    key = (api_base_url, user, password)
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = PooledSession(
+                api_base_url=api_base_url, auth=(user, password)
+            )
+        return _sessions[key]
+
 
 def get_default_session():
-    return client.Session(
-        api_base_url=settings.API_DOMAIN,
-        auth=(settings.USER_ONE, settings.USER_ONE_PASSWORD),
-    )
+    return get_session()
 
 
 def get_user_two_session():
-    return client.Session(
-        api_base_url=settings.API_DOMAIN,
-        auth=(settings.USER_TWO, settings.USER_TWO_PASSWORD),
+    return get_session(user=settings.USER_TWO, password=settings.USER_TWO_PASSWORD)
+
+
+def get_registrations_user_session():
+    return get_session(
+        user=settings.REGISTRATIONS_USER,
+        password=settings.REGISTRATIONS_USER_PASSWORD,
     )
 
 
@@ -100,17 +250,15 @@ def get_node_logs(session, node_id):
     if not session:
         session = get_default_session()
     url = '/v2/nodes/{}/logs'.format(node_id)
-    return session.get(url)['data']
+    return list(iter_data(session, url))
 
 
 def get_most_recent_public_node_id(session):
     """Return the most recent public project node id"""
     url = '/v2/nodes/'
-    data = session.get(url)['data']
-    if data:
-        for node in data:
-            if node['attributes']['public']:
-                return node['id']
+    for node in iter_data(session, url):
+        if node['attributes']['public']:
+            return node['id']
     return None
 
 
@@ -118,9 +266,8 @@ def get_user_institutions(session, user=None):
     if not user:
         user = current_user(session)
     institution_url = user.relationships.institutions['links']['related']['href']
-    data = session.get(institution_url)
     institutions = []
-    for institution in data['data']:
+    for institution in iter_data(session, institution_url):
         institutions.append(institution['attributes']['name'])
     return institutions
 
@@ -172,49 +319,136 @@ def get_regions_data(session):
     """Returns the data for all of the available storage location regions in the
     environment"""
     url = '/v2/regions/'
-    return session.get(url)['data']
+    return list(iter_data(session, url))
 
 
 def get_all_institutions(session):
     url = '/v2/institutions/'
-    data = session.get(url)
     institutions = []
-    for institution in data['data']:
+    for institution in iter_data(session, url, prefetch=True):
         institutions.append(institution['attributes']['name'])
     return institutions
 
 
-def delete_all_user_projects(session, user=None):
+def get_status_code(exc):
+    """Return the status code of an HTTPError. Plain pythosf sessions don't attach the
+    response, only a 'Status code <code>. <content>' message.
+    """
+    if exc.response is not None:
+        return exc.response.status_code
+    match = re.match(r'Status code (\d+)', str(exc))
+    return int(match.group(1)) if match else None
+
+
+def call_with_retries(func, *args, tries=3, backoff=1, **kwargs):
+    """Call `func`, retrying with exponential backoff (`backoff`, then twice that, etc.
+    seconds) when the api responds with one of RETRY_STATUS_CODES.
+    """
+    for attempt in range(tries):
+        try:
+            return func(*args, **kwargs)
+        except requests.exceptions.HTTPError as exc:
+            status_code = get_status_code(exc)
+            if status_code not in RETRY_STATUS_CODES or attempt == tries - 1:
+                raise
+            logger.warning('{} Exception caught. Re-trying request'.format(status_code))
+            time.sleep(backoff * 2**attempt)
+
+
+def iter_pages(session, url, query_parameters=None, prefetch=False):
+    """Yield every page (the full api response) of a list endpoint, following
+    `links.next`. A page is only requested once the previous one has been used, so
+    callers that stop iterating early don't fetch the rest.
+
+    With `prefetch`, the next page is requested in the background while the caller
+    is still working through the current one.
+    """
+    page = call_with_retries(session.get, url, query_parameters=query_parameters)
+    if not prefetch:
+        while True:
+            yield page
+            next_url = page.get('links', {}).get('next')
+            if not next_url:
+                return
+            page = call_with_retries(session.get, next_url)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        while True:
+            next_url = page.get('links', {}).get('next')
+            future = None
+            if next_url:
+                future = executor.submit(call_with_retries, session.get, next_url)
+            yield page
+            if future is None:
+                return
+            page = future.result()
+
+
+def iter_data(session, url, query_parameters=None, prefetch=False):
+    """Yield every item in the `data` of every page of a list endpoint. See
+    `iter_pages`.
+    """
+    for page in iter_pages(session, url, query_parameters, prefetch=prefetch):
+        yield from page['data']
+
+
+def _parent_id(node):
+    """Return the id of a node's parent from its api data, or None for a top level node."""
+    parent = node['relationships'].get('parent', {})
+    href = parent.get('links', {}).get('related', {}).get('href')
+    if not href:
+        return None
+    return href.rstrip('/').split('/')[-1]
+
+
+def _delete_node(session, node_id):
+    n = client.Node(id=node_id, session=session)
+    call_with_retries(n.get)
+    call_with_retries(n.delete)
+
+
+def delete_all_user_projects(session, user=None, workers=CLEANUP_WORKERS, keep=()):
     """Delete all of your user's projects that they have permission to delete
-    except PREFERRED_NODE (if it's set).
+    except PREFERRED_NODE (if it's set) and the projects whose ids are in `keep`.
+
+    Every page of the user's nodes is deleted, up to `workers` at a time. Components
+    are deleted before their parents. Returns a list of (node id, exception) tuples
+    for the nodes that could not be deleted.
     """
     if not user:
         user = current_user(session)
     nodes_url = user.relationships.nodes['links']['related']['href']
-    for _ in range(3):
-        try:
-            data = session.get(nodes_url)
-        except requests.exceptions.HTTPError as exc:
-            if exc.response.status_code == 502:
-                logger.warning('502 Exception caught. Re-trying test')
-                continue
+    try:
+        nodes = list(iter_data(session, nodes_url, prefetch=True))
+    except requests.exceptions.HTTPError as exc:
+        if get_status_code(exc) not in RETRY_STATUS_CODES:
             raise exc
-        else:
-            break
-    else:
         logger.info('Max tries attempted')
         raise Exception('API not responding. Giving up.')
 
+    remaining = {
+        node['id']: _parent_id(node)
+        for node in nodes
+        if node['id'] != settings.PREFERRED_NODE and node['id'] not in keep
+    }
     nodes_failed = []
-    for node in data['data']:
-        if node['id'] != settings.PREFERRED_NODE:
-            n = client.Node(id=node['id'], session=session)
-            try:
-                n.get()
-                n.delete()
-            except Exception as exc:
-                nodes_failed.append((node['id'], exc))
-                continue
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while remaining:
+            # Only delete nodes that have no remaining children in this round
+            parents = set(remaining.values())
+            leaves = [node_id for node_id in remaining if node_id not in parents]
+            if not leaves:
+                leaves = list(remaining)
+            futures = {
+                executor.submit(_delete_node, session, node_id): node_id
+                for node_id in leaves
+            }
+            for future in as_completed(futures):
+                node_id = futures[future]
+                del remaining[node_id]
+                exc = future.exception()
+                if exc is not None:
+                    nodes_failed.append((node_id, exc))
 
     if nodes_failed:
         error_message_list = []
@@ -226,6 +460,7 @@ def delete_all_user_projects(session, user=None):
             )
             error_message_list.append(error_message)
         logger.error('\n'.join(error_message_list))
+    return nodes_failed
 
 
 def delete_project(session, guid, user=None):
@@ -255,9 +490,10 @@ def create_custom_collection(session):
 def delete_custom_collections(session):
     """Delete all custom collections for the current user."""
     collections_url = '{}/v2/collections/'.format(session.api_base_url)
-    data = session.get(collections_url)
+    # Read every page before deleting so that deletions don't shift the pages
+    collections = list(iter_data(session, collections_url))
 
-    for collection in data['data']:
+    for collection in collections:
         if not collection['attributes']['bookmarks']:
             collection_self_url = collections_url + collection['id']
             session.delete(url=collection_self_url, item_type=None)
@@ -268,9 +504,8 @@ def delete_custom_collections(session):
 def get_node_addons(session, node_id):
     """Return a list of the names of all the addons connected to the given node."""
     url = '/v2/nodes/{}/files/'.format(node_id)
-    data = session.get(url, query_parameters={'page[size]': 20})
     providers = []
-    for provider in data['data']:
+    for provider in iter_data(session, url, query_parameters={'page[size]': 20}):
         providers.append(provider['attributes']['provider'])
     return providers
 
@@ -329,9 +564,10 @@ def delete_addon_files(session, provider, current_browser, guid):
     """Delete all files for the given addon."""
     files_url = '{}/v2/nodes/{}/files/{}/'.format(session.api_base_url, guid, provider)
 
-    data = session.get(url=files_url, query_parameters={'page[size]': 20})
+    # Read every page before deleting so that deletions don't shift the pages
+    files = list(iter_data(session, files_url, query_parameters={'page[size]': 20}))
 
-    for file in data['data']:
+    for file in files:
         if file['attributes']['kind'] == 'file':
             delete_url = file['links']['delete']
             file_name = file['attributes']['name']
@@ -352,7 +588,7 @@ def get_providers_list(session=None, type='preprints'):
     if not session:
         session = get_default_session()
     url = '/v2/providers/' + type
-    return session.get(url)['data']
+    return list(iter_data(session, url, prefetch=True))
 
 
 def get_provider(session=None, type='registrations', provider_id='osf'):
@@ -445,7 +681,7 @@ def get_preprints_list_for_user(session, user=None):
     if not user:
         user = current_user(session)
     url = '/v2/users/{}/preprints/'.format(user.id)
-    return session.get(url)['data']
+    return list(iter_data(session, url))
 
 
 def get_preprint_supplemental_material_guid(session, preprint_guid):
@@ -511,11 +747,9 @@ def get_most_recent_preprint_node_id(session=None):
     if not session:
         session = get_default_session()
     url = '/v2/preprints/'
-    data = session.get(url)['data']
-    if data:
-        for preprint in data:
-            if preprint['attributes']['is_published']:
-                return preprint['id']
+    for preprint in iter_data(session, url):
+        if preprint['attributes']['is_published']:
+            return preprint['id']
     return None
 
 
@@ -553,15 +787,13 @@ def get_most_recent_registration_node_id(session=None):
     if not session:
         session = get_default_session()
     url = '/v2/registrations/'
-    data = session.get(url)['data']
-    if data:
-        for registration in data:
-            if (
-                registration['attributes']['public']
-                and (registration['attributes']['revision_state'] == 'approved')
-                and not registration['attributes']['withdrawn']
-            ):
-                return registration['id']
+    for registration in iter_data(session, url):
+        if (
+            registration['attributes']['public']
+            and (registration['attributes']['revision_state'] == 'approved')
+            and not registration['attributes']['withdrawn']
+        ):
+            return registration['id']
     return None
 
 
@@ -573,12 +805,9 @@ def get_registration_schemas_for_provider(session=None, provider_id='osf'):
     if not session:
         session = get_default_session()
     url = 'v2/providers/registrations/{}/schemas/'.format(provider_id)
-    # NOTE: Using '50' as the page size query parameter here. We don't actually have 50
-    # total registration schemas. It's under 30 at this time, but using 50 here gives us
-    # plenty of room to add more schemas without having to update this function.
-    data = session.get(url, query_parameters={'page[size]': 50})['data']
-    if data is None:
-        return None
+    # NOTE: Using '50' as the page size query parameter here so that all of the
+    # schemas (under 30 at this time) usually fit in a single page.
+    data = iter_data(session, url, query_parameters={'page[size]': 50})
     return [[schema['attributes']['name'], schema['id']] for schema in data]
 
 
@@ -759,10 +988,9 @@ def get_license_data_for_provider(
     if not session:
         session = get_default_session()
     url = 'v2/providers/{}/{}/licenses/'.format(provider_type, provider_id)
-    # NOTE: Using '30' as the page size query parameter here. We don't actually have 30
-    # total licenses. It's under 20 at this time, but using 30 here gives us plenty of
-    # room to add more licenses without having to update this function.
-    data = session.get(url, query_parameters={'page[size]': 30})['data']
+    # NOTE: Using '30' as the page size query parameter here so that all of the
+    # licenses (under 20 at this time) usually fit in a single page.
+    data = iter_data(session, url, query_parameters={'page[size]': 30})
     for license in data:
         if license['attributes']['name'] == license_name:
             license_id = license['id']
@@ -785,8 +1013,9 @@ def get_subject_id_for_provider(
         session = get_default_session()
     url = 'v2/providers/{}/{}/subjects/'.format(provider_type, provider_id)
     # NOTE: Using '1000' as the page size query parameter here. Not sure how many
-    # subjects actually exist for a given provider.
-    data = session.get(url, query_parameters={'page[size]': 1000})['data']
+    # subjects actually exist for a given provider, but any further pages are only
+    # fetched if the subject isn't found first.
+    data = iter_data(session, url, query_parameters={'page[size]': 1000})
     for subject in data:
         if subject['attributes']['text'] == subject_name:
             subject_id = subject['id']
@@ -799,7 +1028,7 @@ def get_preprint_requests_records(session=None, node_id=None):
     if not session:
         session = get_default_session()
     url = 'v2/preprints/{}/requests/'.format(node_id)
-    data = session.get(url)['data']
+    data = list(iter_data(session, url))
     if data:
         return data
     else:
@@ -1073,7 +1302,7 @@ def get_existing_file_data(session, node_id=settings.PREFERRED_NODE):
     return name, data
 
 
-def update_custom_project_metadata(session, node_id):
+def update_custom_project_metadata(session, node_id, funders=None):
     """Updates project metadata fields resource_type and
     resource_language and support funder info with custom values"""
     url = 'v2/custom_item_metadata_records/{}/'.format(node_id)
@@ -1087,6 +1316,8 @@ def update_custom_project_metadata(session, node_id):
             },
         }
     }
+    if funders is not None:
+        raw_payload['data']['attributes']['funders'] = funders
     session.put(url=url, raw_body=json.dumps(raw_payload))
 
 
@@ -1108,10 +1339,7 @@ def delete_project_contributor(session, node_id, user_name):
 def update_registration_metadata_with_custom_data(registration_id):
     """Updates registration metadata fields resource_type and
     resource_language  with custom values"""
-    session = client.Session(
-        api_base_url=settings.API_DOMAIN,
-        auth=(settings.REGISTRATIONS_USER, settings.REGISTRATIONS_USER_PASSWORD),
-    )
+    session = get_registrations_user_session()
     url = 'v2/custom_item_metadata_records/{}/'.format(registration_id)
     raw_payload = {
         'data': {
@@ -1147,10 +1375,7 @@ def get_funder_data_registration(registration_guid):
     """Returns the funder name for a project/registration
     if project/registration already has funder information data
     otherwise returns none"""
-    session = client.Session(
-        api_base_url=settings.API_DOMAIN,
-        auth=(settings.REGISTRATIONS_USER, settings.REGISTRATIONS_USER_PASSWORD),
-    )
+    session = get_registrations_user_session()
     url = 'v2/custom_item_metadata_records/{}/'.format(registration_guid)
     data = session.get(url)['data']
     if not data['attributes']['funders']:
@@ -1160,10 +1385,7 @@ def get_funder_data_registration(registration_guid):
 
 def get_registration_by_title(encoded_registration_title):
     """Return the registration node id having the title as given in encoded_registration_title"""
-    session = client.Session(
-        api_base_url=settings.API_DOMAIN,
-        auth=(settings.REGISTRATIONS_USER, settings.REGISTRATIONS_USER_PASSWORD),
-    )
+    session = get_registrations_user_session()
     registration_title = quote(encoded_registration_title)
     url = '/v2/registrations/?filter[title]=' + registration_title
     data = session.get(url)['data']
@@ -1200,10 +1422,7 @@ def update_file_metadata(session, file_guid):
 def get_registration_resource_id(registration_id):
     """This function returns the most recent resource id
     added to the given registration"""
-    session = client.Session(
-        api_base_url=settings.API_DOMAIN,
-        auth=(settings.REGISTRATIONS_USER, settings.REGISTRATIONS_USER_PASSWORD),
-    )
+    session = get_registrations_user_session()
 
     url = '/v2/registrations/{}/resources/'.format(registration_id)
     data = session.get(url)['data']
@@ -1220,10 +1439,7 @@ def get_registration_resource_id(registration_id):
 
 def delete_registration_resource(registration_id):
     """This function deletes the resource added to the given registration"""
-    session = client.Session(
-        api_base_url=settings.API_DOMAIN,
-        auth=(settings.REGISTRATIONS_USER, settings.REGISTRATIONS_USER_PASSWORD),
-    )
+    session = get_registrations_user_session()
     registration_resource_id = get_registration_resource_id(registration_id)
     url = '/v2/resources/{}'.format(registration_resource_id)
 
@@ -1234,10 +1450,7 @@ def create_registration_resource(registration_guid, resource_type):
     """This method creates new registration output resource for a given
     registration."""
 
-    session = client.Session(
-        api_base_url=settings.API_DOMAIN,
-        auth=(settings.REGISTRATIONS_USER, settings.REGISTRATIONS_USER_PASSWORD),
-    )
+    session = get_registrations_user_session()
     resource_id = get_registration_resource_id(registration_guid)
     if resource_id is not None:
         delete_registration_resource(registration_guid)
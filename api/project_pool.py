@@ -0,0 +1,262 @@
+"""A pool of test projects that are reused between tests instead of being created and
+deleted for every test.
+
+Projects are created up front in bulk and leased to tests. When a project is leased
+again it is fetched (with the counts of its components, draft registrations and
+forks) along with its connected storage addons. Only if it was modified since it was
+last handed out (by its `date_modified`), or has draft registrations, forks or
+connected addons (none of which modify it), is it reset to a known state: title,
+description, privacy and tags, contributors, files, view only links, draft
+registrations, forks and addons. Custom metadata doesn't modify the project either,
+so it is always reset. A project is only deleted and replaced when it can't be reset
+(i.e. it has components, or the api doesn't say whether it has any, or a fork can't be
+deleted) or has been deleted by the test.
+
+Wiki pages, comments and logs are not reset, so tests that check them must not use a
+pooled project (see the `fresh_project` marker in `tests/conftest.py`). The ids of the
+projects of every live pool are available from `pooled_node_ids()`, so that cleanups of
+all of the user's projects can leave them alone.
+"""
+
+import json
+import logging
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from api import osf_api
+
+
+logger = logging.getLogger(__name__)
+
+POOL_TAGS = ['qatest', 'project pool']
+PROVISION_WORKERS = 4
+
+# Every pool that hasn't been garbage collected, for pooled_node_ids()
+_pools = weakref.WeakSet()
+
+
+def pooled_node_ids():
+    """Return the ids of the projects of every pool, idle and leased."""
+    return set().union(*(pool.node_ids() for pool in list(_pools)))
+
+
+class ProjectPool:
+    """Lease projects of one kind (private or public, with or without custom
+    metadata) to tests. `size` projects are created when the pool is created.
+    """
+
+    def __init__(
+        self, session, title='OSF Test Project', public=False, metadata=False, size=0
+    ):
+        self.session = session
+        self.title = title
+        self.public = public
+        self.metadata = metadata
+        self.owner_id = osf_api.current_user(session).id
+        self._idle = []
+        # node id -> date_modified when the project was last reset
+        self._baselines = {}
+        self._lock = threading.Lock()
+        _pools.add(self)
+        self.provision(size)
+
+    def provision(self, count, workers=PROVISION_WORKERS):
+        """Create `count` new projects concurrently and add them to the pool."""
+        if count < 1:
+            return
+        with ThreadPoolExecutor(max_workers=min(count, workers)) as executor:
+            nodes = list(executor.map(lambda _: self._create(), range(count)))
+        with self._lock:
+            self._idle.extend(nodes)
+
+    def lease(self):
+        """Return a project in its known state, reset if needed, for a test to use."""
+        while True:
+            with self._lock:
+                node = self._idle.pop() if self._idle else None
+            if node is None:
+                node = self._create()
+                break
+            try:
+                if self._checkout(node):
+                    break
+            except Exception as exc:
+                logger.warning(
+                    'Could not reset pooled project {}: {}'.format(node.id, exc)
+                )
+            self._discard(node)
+        return node
+
+    def release(self, node):
+        """Return a leased project to the pool. It is checked (and reset if needed)
+        when it is next leased. Projects that the test deleted are dropped.
+        """
+        if node.id is None:
+            return
+        with self._lock:
+            self._idle.append(node)
+
+    def node_ids(self):
+        """Return the ids of the projects of this pool, idle and leased."""
+        with self._lock:
+            return set(self._baselines)
+
+    def close(self):
+        """Delete every project in the pool, including leased ones."""
+        with self._lock:
+            nodes, self._idle = self._idle, []
+        for node in nodes:
+            self._discard(node)
+
+    def _create(self):
+        node = osf_api.call_with_retries(
+            osf_api.create_project,
+            self.session,
+            title=self.title,
+            tags=list(POOL_TAGS),
+            public=self.public or None,
+        )
+        self._set_baseline(node)
+        if self.metadata:
+            self._reset_metadata(node)
+            node.get()
+            self._set_baseline(node)
+        return node
+
+    def _set_baseline(self, node):
+        with self._lock:
+            self._baselines[node.id] = node.date_modified
+
+    def _discard(self, node):
+        with self._lock:
+            self._baselines.pop(node.id, None)
+        try:
+            node.delete()
+        except requests.exceptions.HTTPError as exc:
+            if osf_api.get_status_code(exc) not in (404, 410):
+                logger.warning(
+                    'Could not delete pooled project {}: {}'.format(node.id, exc)
+                )
+
+    def _checkout(self, node):
+        """Fetch a project and reset it if it was modified. Returns False if the
+        project can't be reset.
+        """
+        try:
+            node.get(
+                query_parameters={
+                    'related_counts': 'children,draft_registrations,forks'
+                }
+            )
+        except requests.exceptions.HTTPError as exc:
+            if osf_api.get_status_code(exc) in (404, 410):
+                # Deleted by a test or by a cleanup of all of the user's projects
+                with self._lock:
+                    self._baselines.pop(node.id, None)
+                node.id = None
+                return False
+            raise
+        children = _related_count(node, 'children')
+        if children is None or children:
+            # Components can't be reset, and without the count there may be some
+            return False
+        if (
+            node.date_modified == self._baselines.get(node.id)
+            and _related_count(node, 'draft_registrations') == 0
+            and _related_count(node, 'forks') == 0
+            and not self._connected_addons(node)
+        ):
+            if self.metadata:
+                self._reset_metadata(node)
+            return True
+        self._reset(node)
+        node.get()
+        self._set_baseline(node)
+        return True
+
+    def _reset(self, node):
+        attributes = {
+            'title': self.title,
+            'description': '',
+            'public': self.public,
+        }
+        changed = {
+            key: value
+            for key, value in attributes.items()
+            if getattr(node, key, None) != value
+        }
+        if sorted(getattr(node, 'tags', None) or []) != sorted(POOL_TAGS):
+            changed['tags'] = POOL_TAGS
+        if changed:
+            raw_payload = {
+                'data': {'type': 'nodes', 'id': node.id, 'attributes': changed}
+            }
+            self.session.patch(
+                url='/v2/nodes/{}/'.format(node.id),
+                item_type='nodes',
+                item_id=node.id,
+                raw_body=json.dumps(raw_payload),
+            )
+
+        contributors_url = '/v2/nodes/{}/contributors/'.format(node.id)
+        for contributor in list(osf_api.iter_data(self.session, contributors_url)):
+            user_id = contributor['relationships']['users']['data']['id']
+            if user_id != self.owner_id:
+                self.session.delete(
+                    '{}{}/'.format(contributors_url, user_id), item_type='users'
+                )
+
+        files_url = '/v2/nodes/{}/files/osfstorage/'.format(node.id)
+        for file in list(osf_api.iter_data(self.session, files_url)):
+            osf_api.delete_file(self.session, file['links']['delete'])
+
+        drafts_url = '/v2/nodes/{}/draft_registrations/'.format(node.id)
+        for draft in list(osf_api.iter_data(self.session, drafts_url)):
+            self.session.delete(
+                '/v2/draft_registrations/{}/'.format(draft['id']),
+                item_type='draft_registrations',
+            )
+
+        links_url = '/v2/nodes/{}/view_only_links/'.format(node.id)
+        for link in list(osf_api.iter_data(self.session, links_url)):
+            self.session.delete(
+                '{}{}/'.format(links_url, link['id']), item_type='view-only-links'
+            )
+
+        forks_url = '/v2/nodes/{}/forks/'.format(node.id)
+        for fork in list(osf_api.iter_data(self.session, forks_url)):
+            self.session.delete('/v2/nodes/{}/'.format(fork['id']), item_type='nodes')
+
+        # Connecting an addon that is already connected fails, so disconnect them
+        for provider in self._connected_addons(node):
+            self.session.delete(
+                '/v2/nodes/{}/addons/{}/'.format(node.id, provider),
+                item_type='node_addons',
+            )
+
+        if self.metadata:
+            self._reset_metadata(node)
+
+    def _connected_addons(self, node):
+        """Return the providers of the storage addons connected to a project."""
+        addons_url = '/v2/nodes/{}/addons/'.format(node.id)
+        return [addon['id'] for addon in osf_api.iter_data(self.session, addons_url)]
+
+    def _reset_metadata(self, node):
+        """Set the custom metadata that the metadata tests start from, clearing any
+        funders that a test added.
+        """
+        osf_api.update_custom_project_metadata(
+            self.session, node_id=node.id, funders=[]
+        )
+
+
+def _related_count(node, relationship):
+    """Return the number of related objects of a node fetched with `related_counts`,
+    or None if the api didn't include the count.
+    """
+    related = getattr(node.relationships, relationship, None) or {}
+    return related.get('links', {}).get('related', {}).get('meta', {}).get('count')
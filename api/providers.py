@@ -0,0 +1,59 @@
+"""Keep the provider lists that the provider tests are parametrized with in a local
+file, so that collecting the tests makes no api requests.
+
+The lists are fetched by `invoke refresh_providers`, which the invoke test tasks run
+at the start of every run, so the tests are parametrized with the providers as they
+are when the run starts. Every collection of that run (retries, shards and worker
+pool workers) then reads the same lists from the file. Runs outside of the invoke
+tasks fetch the lists when they find none for their environment in the file.
+"""
+
+import json
+import os
+import time
+
+import settings
+from api import osf_api
+
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.providers.json'
+)
+PROVIDER_TYPES = ('preprints', 'registrations', 'collections')
+
+
+def load_providers_list(type='preprints', path=DEFAULT_PATH):
+    """Return the providers list of the given type for this environment from the
+    file, or None if it hasn't been fetched.
+    """
+    try:
+        with open(path) as providers_file:
+            stored = json.load(providers_file)
+    except (OSError, ValueError):
+        return None
+    return stored.get(settings.DOMAIN, {}).get('lists', {}).get(type)
+
+
+def refresh_providers_lists(types=PROVIDER_TYPES, path=DEFAULT_PATH):
+    """Fetch the providers lists of this environment and write them to the file,
+    keeping the lists of other environments.
+    """
+    try:
+        with open(path) as providers_file:
+            stored = json.load(providers_file)
+    except (OSError, ValueError):
+        stored = {}
+    session = osf_api.get_default_session()
+    stored[settings.DOMAIN] = {
+        'fetched': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'lists': {
+            type: osf_api.get_providers_list(session=session, type=type)
+            for type in types
+        },
+    }
+    # Replace the file in one step so that concurrent collections never read half of it
+    temp_path = '{}.{}'.format(path, os.getpid())
+    with open(temp_path, 'w') as providers_file:
+        json.dump(stored, providers_file, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+    return stored[settings.DOMAIN]['lists']
@@ -0,0 +1,70 @@
+"""Create the api data that the selected tests need up front and concurrently, instead
+of one object at a time inside each test's setup while the browser sits idle.
+
+Recipes are registered by name with a function that creates an object (and
+optionally one that deletes it). Once the tests have been collected, `plan` starts
+creating as many objects of a recipe as the tests will need in the background, and
+fixtures `take` them as they go. A fixture that finds nothing planned (i.e. the
+recipe wasn't planned or every planned object was taken) gets None and creates the
+object itself as before.
+"""
+
+import logging
+from collections import (
+    defaultdict,
+    deque,
+)
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+PROVISION_WORKERS = 8
+
+
+class Provisioner:
+    def __init__(self, workers=PROVISION_WORKERS):
+        self.recipes = {}
+        self._planned = defaultdict(deque)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def register(self, name, create, destroy=None):
+        """Register a recipe: `create()` returns a new object and `destroy(obj)` cleans
+        up an object that no test took.
+        """
+        self.recipes[name] = (create, destroy)
+
+    def plan(self, name, count=1):
+        """Start creating `count` objects of the named recipe in the background."""
+        create, _ = self.recipes[name]
+        for _ in range(count):
+            self._planned[name].append(self._executor.submit(create))
+
+    def take(self, name):
+        """Return the next planned object of the named recipe, waiting for it to be
+        created if needed, or None if there are no planned objects left. Raises the
+        exception if creating the object failed.
+        """
+        try:
+            future = self._planned[name].popleft()
+        except IndexError:
+            return None
+        return future.result()
+
+    def close(self):
+        """Stop creating objects that haven't been started and clean up the objects
+        that were created but never taken.
+        """
+        for name, futures in self._planned.items():
+            _, destroy = self.recipes[name]
+            while futures:
+                future = futures.popleft()
+                if future.cancel():
+                    continue
+                try:
+                    obj = future.result()
+                    if destroy is not None:
+                        destroy(obj)
+                except Exception as exc:
+                    logger.warning('Unused {} was not cleaned up: {}'.format(name, exc))
+        self._executor.shutdown(wait=True)
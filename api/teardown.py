@@ -0,0 +1,123 @@
+"""Run api cleanup (deleting projects, tokens, etc.) in the background while the next
+test runs, instead of making the next test wait for it. Only defer cleanup that can't
+interfere with what the next test does.
+
+Work deferred with the same `key` (e.g. the guid of the project that it cleans up)
+runs in the order that it was deferred, so that e.g. a pooled project is only
+returned to the pool once the cleanup of it is done. Work can also be made to wait for other deferred
+work with `after`. Failures don't fail the test that deferred the work, they are
+collected and raised together when the queue is closed at the end of the session.
+"""
+
+import functools
+import logging
+import threading
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    wait,
+)
+
+from pythosf import client
+
+from api import osf_api
+
+
+logger = logging.getLogger(__name__)
+
+
+class TeardownError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(
+            '{} deferred teardown(s) failed:\n{}'.format(
+                len(errors),
+                '\n'.join(
+                    '{}: {!r}'.format(description, exc) for description, exc in errors
+                ),
+            )
+        )
+
+
+class TeardownQueue:
+    """Run deferred teardown work on a pool of `workers` threads. With no workers the
+    work is run right away in the calling thread (but failures are still collected).
+    """
+
+    def __init__(self, workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=workers) if workers else None
+        self._lock = threading.Lock()
+        # key -> future of the work that was last deferred with that key
+        self._last = {}
+        self._pending = set()
+        self.errors = []
+
+    def defer(self, func, *args, key=None, after=(), **kwargs):
+        """Call `func(*args, **kwargs)` in the background (retrying when the api is
+        temporarily unavailable) once `after` (futures returned by earlier calls) and
+        the earlier work with the same `key` are done. Returns a future.
+        """
+        if self._executor is None:
+            self._run(after, func, args, kwargs)
+            return None
+        with self._lock:
+            dependencies = list(after)
+            if key is not None and key in self._last:
+                dependencies.append(self._last[key])
+            # Work only ever waits for work that was submitted before it, which the
+            # executor has already started, so the workers can't deadlock.
+            future = self._executor.submit(self._run, dependencies, func, args, kwargs)
+            if key is not None:
+                self._last[key] = future
+            self._pending.add(future)
+        future.add_done_callback(functools.partial(self._done, key))
+        return future
+
+    def wait(self, key=None):
+        """Wait for the deferred work with the given key (or all of it) to finish."""
+        with self._lock:
+            if key is None:
+                futures = list(self._pending)
+            else:
+                futures = [self._last[key]] if key in self._last else []
+        wait(futures)
+
+    def close(self):
+        """Wait for all of the deferred work to finish, and raise a TeardownError with
+        every failure if any of it failed.
+        """
+        if self._executor is not None:
+            self.wait()
+            self._executor.shutdown(wait=True)
+        if self.errors:
+            raise TeardownError(self.errors)
+
+    def _run(self, dependencies, func, args, kwargs):
+        wait(dependencies)
+        try:
+            osf_api.call_with_retries(func, *args, **kwargs)
+        except Exception as exc:
+            description = _describe(func, args, kwargs)
+            logger.warning('Deferred teardown {} failed: {}'.format(description, exc))
+            with self._lock:
+                self.errors.append((description, exc))
+
+    def _done(self, key, future):
+        with self._lock:
+            self._pending.discard(future)
+            if key is not None and self._last.get(key) is future:
+                del self._last[key]
+
+
+def _describe(func, args, kwargs):
+    """Describe a call for the error report, leaving out the api session."""
+    name = getattr(func, '__qualname__', None) or repr(func)
+    target = getattr(getattr(func, '__self__', None), 'id', None)
+    if target:
+        name = '{}<{}>'.format(name, target)
+    arguments = [repr(arg) for arg in args if not isinstance(arg, client.Session)]
+    arguments += [
+        '{}={!r}'.format(keyword, value)
+        for keyword, value in kwargs.items()
+        if not isinstance(value, client.Session)
+    ]
+    return '{}({})'.format(name, ', '.join(arguments))
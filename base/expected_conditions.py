@@ -1,3 +1,11 @@
+import time
+
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+    TimeoutException,
+)
+from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 
 
@@ -25,3 +33,389 @@ class window_at_index(object):
 
     def __call__(self, driver):
         return len(driver.window_handles) > self.page_index
+
+
+# Locator strategies that can be resolved inside the page. Any other strategy (e.g.
+# link text) is found with a `find_element` call and then probed.
+JS_STRATEGIES = (By.CSS_SELECTOR, By.ID, By.NAME, By.CLASS_NAME, By.TAG_NAME, By.XPATH)
+
+# Functions shared by the scripts below: `findElement` finds the first element
+# matching a locator (with one of JS_STRATEGIES) and `isShown` checks whether an
+# element is visible.
+DOM_HELPERS = """
+var findElement = function (strategy, path) {
+    if (strategy === 'css selector') {
+        return document.querySelector(path);
+    } else if (strategy === 'id') {
+        return document.getElementById(path);
+    } else if (strategy === 'name') {
+        return document.getElementsByName(path)[0];
+    } else if (strategy === 'class name') {
+        return document.getElementsByClassName(path)[0];
+    } else if (strategy === 'tag name') {
+        return document.getElementsByTagName(path)[0];
+    } else if (strategy === 'xpath') {
+        return document.evaluate(
+            path, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+        ).singleNodeValue;
+    }
+    return null;
+};
+var isShown = function (el) {
+    var target = el;
+    if (el.tagName === 'OPTION' || el.tagName === 'OPTGROUP') {
+        target = el.closest('select') || el;
+    }
+    // visibility is inherited, but an ancestor with an opacity of 0 hides its children
+    var shown = target.getClientRects().length > 0 &&
+        window.getComputedStyle(target).visibility !== 'hidden';
+    for (var node = target; shown && node; node = node.parentElement) {
+        shown = window.getComputedStyle(node).opacity !== '0';
+    }
+    return shown;
+};
+"""
+
+# Finds the element (unless it is passed in) and returns it if it is visible, enabled
+# and, when asked for, has an href. Otherwise returns the name of the first check that
+# failed: 'absent', 'hidden', 'disabled' or 'no_href'.
+ELEMENT_READY_PROBE = (
+    DOM_HELPERS
+    + """
+var strategy = arguments[0], path = arguments[1], el = arguments[2],
+    checkHref = arguments[3];
+if (!el) {
+    el = findElement(strategy, path);
+}
+if (!el) {
+    return 'absent';
+}
+if (!isShown(el)) {
+    return 'hidden';
+}
+if (el.matches(':disabled')) {
+    return 'disabled';
+}
+if (checkHref && !el.getAttribute('href')) {
+    return 'no_href';
+}
+return el;
+"""
+)
+
+
+# Runs ELEMENT_READY_PROBE on an already located element and also returns the url of
+# the page, so that cached elements can be dropped after a navigation.
+ELEMENT_REVALIDATE_PROBE = (
+    """
+var ready = (function () {%s}).apply(null, arguments);
+return [ready, window.location.href];
+"""
+    % ELEMENT_READY_PROBE
+)
+
+
+class element_to_be_ready(object):
+    """An Expectation for checking that an element is present, visible and enabled
+    (and, if `check_href`, has an href). All of the checks are made by a single script
+    per poll, which returns the WebElement once it is ready.
+
+    How long all of the checks together are waited for is up to the wait that polls
+    the condition: a `base.waits.WebDriverWait` is cut short to what is left of the
+    active `Deadline` (see `base.waits.capped`). `timeout`, if given, only limits how
+    long any one check may take, starting when the previous check first passed.
+    `state` holds the furthest check that has not passed yet: 'absent', 'hidden',
+    'disabled' or 'no_href', and `durations` how many seconds each check that has
+    passed took to pass.
+    """
+
+    checks = ('absent', 'hidden', 'disabled', 'no_href')
+
+    def __init__(self, locator, check_href=False, timeout=None):
+        self.locator = locator
+        self.check_href = check_href
+        self.timeout = timeout
+        self.state = 'absent'
+        self.check_started = time.monotonic()
+        self.durations = {}
+        self.failed = False
+
+    def probe(self, driver):
+        by, path = self.locator
+        element = None
+        if by not in JS_STRATEGIES:
+            try:
+                element = driver.find_element(by, path)
+            except NoSuchElementException:
+                return 'absent'
+        try:
+            return driver.execute_script(
+                ELEMENT_READY_PROBE, by, path, element, self.check_href
+            )
+        except StaleElementReferenceException:
+            return 'absent'
+
+    def waited(self):
+        """Return how many seconds the current check has been waited for."""
+        return time.monotonic() - self.check_started
+
+    def _advance(self, index, now):
+        """Mark the checks before `index` as passed."""
+        for check in self.checks[self.checks.index(self.state) : index]:
+            if check != 'no_href' or self.check_href:
+                self.durations[check] = now - self.check_started
+            self.check_started = now
+        if index < len(self.checks):
+            self.state = self.checks[index]
+
+    @property
+    def script(self):
+        """The probe to wait on inside the page (see `base.waits`), or None if the
+        element can't be found there.
+        """
+        return ELEMENT_READY_PROBE if self.locator[0] in JS_STRATEGIES else None
+
+    @property
+    def args(self):
+        by, path = self.locator
+        return (by, path, None, self.check_href)
+
+    @property
+    def unwanted(self):
+        # Wait in the page until a check after the current one fails, or none do
+        return list(self.checks[: self.checks.index(self.state) + 1])
+
+    def time_left(self):
+        """Return how many seconds the current check may still be waited for."""
+        if self.timeout is None:
+            return None
+        return self.timeout - self.waited()
+
+    def __call__(self, driver):
+        return self.update(self.probe(driver))
+
+    def update(self, result):
+        """Take the result of a probe: return the element if it is ready, otherwise
+        record the checks that have passed and return False. Raises TimeoutException
+        if the current check has run out of time.
+        """
+        now = time.monotonic()
+        if not isinstance(result, str):
+            self._advance(len(self.checks), now)
+            return result
+        if self.checks.index(result) > self.checks.index(self.state):
+            self._advance(self.checks.index(result), now)
+        elif self.timeout is not None and now - self.check_started > self.timeout:
+            raise TimeoutException()
+        return False
+
+
+# Async script template (format with a function body that checks a condition) that
+# calls back as soon as the check returns something not in `unwanted`, or with
+# the last result after `timeout` ms. The check is run whenever the DOM changes, and
+# every 100ms for changes that aren't DOM mutations (i.e. styles from stylesheets).
+WAIT_SCRIPT = """
+var check = function () {%s};
+var args = arguments[0], unwanted = arguments[1], timeout = arguments[2],
+    done = arguments[arguments.length - 1];
+var finished = false, observer = null, interval = null, timer = null, last;
+var finish = function (value) {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    if (observer) {
+        observer.disconnect();
+    }
+    clearInterval(interval);
+    clearTimeout(timer);
+    done(value);
+};
+var evaluate = function () {
+    if (finished) {
+        return;
+    }
+    try {
+        last = check.apply(null, args);
+    } catch (error) {
+        finish({waitError: String(error)});
+        return;
+    }
+    if (unwanted.indexOf(last) === -1) {
+        finish(last);
+    }
+};
+evaluate();
+if (!finished) {
+    observer = new MutationObserver(evaluate);
+    observer.observe(document, {
+        attributes: true, childList: true, characterData: true, subtree: true
+    });
+    interval = setInterval(evaluate, 100);
+    timer = setTimeout(function () { finish(last); }, timeout);
+}
+"""
+
+# Async script template (format with a function body that returns a json value) that
+# calls back with [true, result] once the check's result has stayed the same for
+# `stableFor` ms, or with [false, last result] after `timeout` ms. With `hasInitial`,
+# the result must first change from `initial`. The check is run whenever the DOM
+# changes and every 50ms.
+STABLE_SCRIPT = """
+var check = function () {%s};
+var args = arguments[0], stableFor = arguments[1], timeout = arguments[2],
+    initial = JSON.stringify(arguments[3]), hasInitial = arguments[4],
+    done = arguments[arguments.length - 1];
+var deadline = Date.now() + timeout, changed = !hasInitial, finished = false;
+var value, since, observer, interval;
+var finish = function (stable) {
+    if (finished) {
+        return;
+    }
+    finished = true;
+    observer.disconnect();
+    clearInterval(interval);
+    done([stable, value === undefined ? null : JSON.parse(value)]);
+};
+var evaluate = function () {
+    if (finished) {
+        return;
+    }
+    var now = Date.now(), result;
+    try {
+        result = JSON.stringify(check.apply(null, args));
+    } catch (error) {
+        value = JSON.stringify({waitError: String(error)});
+        finish(true);
+        return;
+    }
+    if (result !== value) {
+        value = result;
+        since = now;
+        changed = changed || result !== initial;
+    }
+    if (changed && now - since >= stableFor) {
+        finish(true);
+    } else if (now >= deadline) {
+        finish(false);
+    }
+};
+observer = new MutationObserver(evaluate);
+observer.observe(document, {
+    attributes: true, childList: true, characterData: true, subtree: true
+});
+interval = setInterval(evaluate, 50);
+evaluate();
+"""
+
+# Tracks the page's fetch/XHR requests in `window.__seleniumReadiness` by wrapping
+# fetch and XMLHttpRequest. Installed before the page's own scripts run where the
+# browser allows it (see `utils.track_requests`), so that the app's boot requests are
+# seen, and otherwise by the first `SETTLED_SCRIPT` on the page.
+REQUEST_TRACKER_SCRIPT = """
+(function () {
+    if (window.__seleniumReadiness) {
+        return;
+    }
+    var state = window.__seleniumReadiness = {pending: 0, lastActivity: Date.now()};
+    var start = function () {
+        state.pending++;
+        state.lastActivity = Date.now();
+    };
+    var finish = function () {
+        state.pending = Math.max(state.pending - 1, 0);
+        state.lastActivity = Date.now();
+    };
+    if (window.fetch) {
+        var fetch = window.fetch;
+        window.fetch = function () {
+            start();
+            try {
+                return fetch.apply(this, arguments).then(
+                    function (response) { finish(); return response; },
+                    function (error) { finish(); throw error; }
+                );
+            } catch (error) {
+                finish();
+                throw error;
+            }
+        };
+    }
+    var send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        start();
+        this.addEventListener('loadend', finish);
+        try {
+            return send.apply(this, arguments);
+        } catch (error) {
+            this.removeEventListener('loadend', finish);
+            finish();
+            throw error;
+        }
+    };
+})();
+"""
+
+# Async script that calls back with true once the page has settled: it has loaded, it
+# has no fetch/XHR requests in flight (nor jQuery ajax requests), no request has
+# finished for `quiet` ms, and Ember isn't in the middle of a run loop. Calls back with
+# false if the page hasn't settled after `timeout` ms.
+#
+# When the request tracker could only be installed by this script, requests that were
+# already in flight aren't counted as pending, but every request that finishes is
+# still seen as activity through the Resource Timing entries. `window.Ember` (and
+# `Ember.Test.checkWaiters`) are usually not exposed by production ember-osf-web
+# builds, so the Ember checks only apply to development and test builds.
+SETTLED_SCRIPT = (
+    REQUEST_TRACKER_SCRIPT
+    + """
+var timeout = arguments[0], quiet = arguments[1],
+    done = arguments[arguments.length - 1];
+var state = window.__seleniumReadiness;
+var perf = window.performance;
+var timeOrigin = perf && (perf.timeOrigin || (perf.timing && perf.timing.navigationStart));
+var lastResponse = function () {
+    if (!timeOrigin || !perf.getEntriesByType) {
+        return 0;
+    }
+    var entries = perf.getEntriesByType('resource'), last = 0;
+    for (var i = 0; i < entries.length; i++) {
+        last = Math.max(last, entries[i].responseEnd);
+    }
+    return last ? timeOrigin + last : 0;
+};
+var busy = function () {
+    if (document.readyState !== 'complete' || state.pending > 0) {
+        return true;
+    }
+    if (window.jQuery && window.jQuery.active > 0) {
+        return true;
+    }
+    var ember = window.Ember;
+    if (ember && ember.run && ember.run.currentRunLoop) {
+        return true;
+    }
+    return !!(ember && ember.Test && ember.Test.checkWaiters &&
+        ember.Test.checkWaiters());
+};
+var deadline = Date.now() + timeout, settledSince = null;
+(function check() {
+    var now = Date.now();
+    if (busy()) {
+        settledSince = null;
+    } else {
+        settledSince = settledSince || now;
+        var lastActivity = Math.max(settledSince, state.lastActivity, lastResponse());
+        if (now - lastActivity >= quiet) {
+            done(true);
+            return;
+        }
+    }
+    if (now >= deadline) {
+        done(false);
+        return;
+    }
+    setTimeout(check, 20);
+})();
+"""
+)
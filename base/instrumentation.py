@@ -0,0 +1,346 @@
+"""Record how long every WebDriver command takes, which test it was made in, and which
+page attribute (locator) it was made for, and how long locators wait for elements.
+
+Nothing is recorded until a `CommandRecorder` is installed (see
+`plugins/webdriver_profile.py`). Drivers created by `utils.launch_driver` are then
+instrumented by wrapping their `execute` method, which every WebDriver and
+WebElement command goes through. Likewise, locator waits are only recorded once a
+`WaitRecorder` is installed (see `plugins/locator_waits.py`).
+
+Commands are attributed to a locator in two ways: commands made while a page
+attribute is being located (`locating`) are attributed to that attribute, and
+commands made on an element afterwards (i.e. `click`) are attributed to the
+attribute that the element was located for.
+"""
+
+import bisect
+import threading
+import time
+from collections import defaultdict
+from contextlib import (
+    contextmanager,
+    nullcontext,
+)
+
+
+# The keys that an element reference is returned under (JSON Wire and W3C)
+ELEMENT_KEYS = ('ELEMENT', 'element-6066-11e4-a52e-4f735466cecf')
+# How many element ids to remember the locators of before starting over
+MAX_REMEMBERED_ELEMENTS = 10000
+
+# Upper bounds (in seconds) of the buckets of the locator wait histograms, the last
+# bucket holds everything slower
+WAIT_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16)
+# Waits that take at least this fraction of the locator's timeout count as near it
+NEAR_TIMEOUT = 0.75
+# Phase of a locator wait that each of the `element_to_be_ready` checks measures
+WAIT_PHASES = {
+    'absent': 'presence',
+    'hidden': 'visibility',
+    'disabled': 'clickable',
+    'no_href': 'href',
+}
+
+_recorder = None
+_wait_recorder = None
+# locator -> 'PageClass.attribute_name' of the page it was last accessed on
+_labels = {}
+
+
+class CommandRecorder:
+    """Sum the number, total and maximum duration of WebDriver commands by test, by
+    command name and by locator.
+    """
+
+    def __init__(self):
+        # nodeid of the test that is running, None outside of tests
+        self.test = None
+        # (test, command, locator) -> [count, seconds, max seconds]
+        self.stats = defaultdict(lambda: [0, 0.0, 0.0])
+        # element id -> label of the locator that the element was located for
+        self.elements = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def instrument(self, driver):
+        """Record every command that the driver executes."""
+        execute = driver.execute
+
+        def instrumented_execute(driver_command, params=None):
+            start = time.perf_counter()
+            try:
+                response = execute(driver_command, params)
+            finally:
+                self.record(driver_command, params, time.perf_counter() - start)
+            if self.locating_label is not None and response:
+                self._remember_elements(response.get('value'))
+            return response
+
+        driver.execute = instrumented_execute
+        return driver
+
+    def start_test(self, nodeid):
+        """Attribute the commands made from now on to the given test (None for
+        outside of tests).
+        """
+        self.test = nodeid
+        if len(self.elements) > MAX_REMEMBERED_ELEMENTS:
+            # Most of them have long gone stale
+            self.elements.clear()
+
+    @property
+    def locating_label(self):
+        return getattr(self._local, 'label', None)
+
+    @contextmanager
+    def locating(self, label):
+        previous = self.locating_label
+        self._local.label = label
+        try:
+            yield
+        finally:
+            self._local.label = previous
+
+    def record(self, driver_command, params, seconds):
+        label = self.locating_label
+        if label is None and params:
+            label = self.elements.get(params.get('id'))
+        with self._lock:
+            stats = self.stats[(self.test, driver_command, label)]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def report(self):
+        """Return the recorded commands summed up by test and by locator."""
+        totals = _Totals()
+        commands = defaultdict(_Totals)
+        tests = defaultdict(_Totals)
+        locators = defaultdict(_Totals)
+        with self._lock:
+            stats = list(self.stats.items())
+        for (test, command, label), (count, seconds, slowest) in stats:
+            totals.add(command, count, seconds, slowest)
+            commands[command].add(command, count, seconds, slowest)
+            tests[test or '(outside of tests)'].add(command, count, seconds, slowest)
+            if label is not None:
+                locators[label].add(command, count, seconds, slowest)
+        return {
+            'total': totals.as_dict(by_command=False),
+            'commands': _sorted_dicts(commands, by_command=False),
+            'tests': _sorted_dicts(tests),
+            'locators': _sorted_dicts(locators),
+        }
+
+    def _remember_elements(self, value):
+        for item in value if isinstance(value, list) else [value]:
+            if isinstance(item, dict):
+                for key in ELEMENT_KEYS:
+                    if key in item:
+                        self.elements[item[key]] = self.locating_label
+
+
+class WaitRecorder:
+    """Keep a histogram of how long each phase of each locator's waits took, and how
+    often they came close to (or reached) the locator's timeout.
+    """
+
+    def __init__(self):
+        # label -> phase -> histogram, see `new_histogram`
+        self.histograms = defaultdict(dict)
+        # `here_then_gone` calls, how many of them never saw the element appear, and
+        # the seconds saved by not waiting the locator's full timeout for it to appear
+        self.loading_calls = 0
+        self.loading_unseen = 0
+        self.loading_saved_seconds = 0.0
+        # label -> [hits, misses] of the pages' element caches (see `ElementCache`)
+        self.cache_stats = defaultdict(lambda: [0, 0])
+        self._lock = threading.Lock()
+
+    def record(self, label, phase, seconds, timeout, failed=False):
+        with self._lock:
+            phases = self.histograms[label]
+            histogram = phases.get(phase) or phases.setdefault(phase, new_histogram())
+            histogram['buckets'][bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+            histogram['count'] += 1
+            histogram['seconds'] += seconds
+            histogram['max_seconds'] = max(histogram['max_seconds'], seconds)
+            histogram['timeout'] = timeout
+            if failed:
+                histogram['failed'] += 1
+            elif seconds >= NEAR_TIMEOUT * timeout:
+                histogram['near_timeout'] += 1
+
+    def record_loading(self, saved_seconds, appeared):
+        with self._lock:
+            self.loading_calls += 1
+            if not appeared:
+                self.loading_unseen += 1
+            self.loading_saved_seconds += saved_seconds
+
+    def record_cache(self, label, hit):
+        with self._lock:
+            self.cache_stats[label][0 if hit else 1] += 1
+
+
+def new_histogram():
+    return {
+        'buckets': [0] * (len(WAIT_BUCKETS) + 1),
+        'count': 0,
+        'seconds': 0.0,
+        'max_seconds': 0.0,
+        'near_timeout': 0,
+        'failed': 0,
+        'timeout': None,
+    }
+
+
+def merge_histograms(histograms, other):
+    """Add the label -> phase -> histogram dict `other` to `histograms`."""
+    for label, phases in other.items():
+        for phase, histogram in phases.items():
+            merged = histograms.setdefault(label, {}).setdefault(phase, new_histogram())
+            if len(merged['buckets']) != len(histogram['buckets']):
+                # Recorded with different buckets, start over
+                merged.update(new_histogram())
+            for index, count in enumerate(histogram['buckets']):
+                merged['buckets'][index] += count
+            for key in ('count', 'seconds', 'near_timeout', 'failed'):
+                merged[key] += histogram[key]
+            merged['max_seconds'] = max(merged['max_seconds'], histogram['max_seconds'])
+            merged['timeout'] = histogram['timeout']
+    return histograms
+
+
+class _Totals:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = 0.0
+        self.commands = defaultdict(lambda: [0, 0.0])
+
+    def add(self, command, count, seconds, slowest):
+        self.count += count
+        self.seconds += seconds
+        self.slowest = max(self.slowest, slowest)
+        self.commands[command][0] += count
+        self.commands[command][1] += seconds
+
+    def as_dict(self, by_command=True):
+        totals = {
+            'count': self.count,
+            'seconds': round(self.seconds, 4),
+            'max_seconds': round(self.slowest, 4),
+        }
+        if by_command:
+            totals['commands'] = {
+                command: {'count': count, 'seconds': round(seconds, 4)}
+                for command, (count, seconds) in sorted(
+                    self.commands.items(), key=lambda pair: -pair[1][1]
+                )
+            }
+        return totals
+
+
+def _sorted_dicts(totals, by_command=True):
+    """Return the totals as dicts, slowest first."""
+    return {
+        key: value.as_dict(by_command)
+        for key, value in sorted(totals.items(), key=lambda pair: -pair[1].seconds)
+    }
+
+
+def install(recorder):
+    """Start recording the commands of drivers instrumented from now on."""
+    global _recorder
+    _recorder = recorder
+
+
+def get_recorder():
+    return _recorder
+
+
+def instrument(driver):
+    """Instrument a driver if a recorder is installed."""
+    if _recorder is not None:
+        _recorder.instrument(driver)
+    return driver
+
+
+def install_wait_recorder(wait_recorder):
+    """Start recording how long locators wait for their elements."""
+    global _wait_recorder
+    _wait_recorder = wait_recorder
+
+
+def get_wait_recorder():
+    return _wait_recorder
+
+
+def locator_label(locator, attribute_name, owner=None):
+    """Return the label of a locator: 'PageClass.attribute_name' once it has been
+    accessed on a page (or component) class `owner`, otherwise the attribute name.
+    """
+    if owner is not None:
+        label = _labels[locator] = '{}.{}'.format(owner, attribute_name)
+        return label
+    return _labels.get(locator, attribute_name)
+
+
+def locating(locator, attribute_name, owner=None):
+    """Attribute the commands made in this context to a page attribute. `owner` is
+    the name of the page (or component) class that the attribute was accessed on.
+    """
+    if _recorder is None and _wait_recorder is None:
+        return nullcontext()
+    label = locator_label(locator, attribute_name, owner)
+    if _recorder is None:
+        return nullcontext()
+    return _recorder.locating(label)
+
+
+def record_loading(
+    locator, attribute_name, appeared, appear_seconds, gone_seconds, gone_timeout
+):
+    """Record a `here_then_gone` wait: how long the element took to disappear, and
+    how many seconds were saved compared to waiting the locator's full timeout for
+    an element that never appeared.
+    """
+    if _wait_recorder is None:
+        return
+    label = locator_label(locator, attribute_name)
+    _wait_recorder.record(label, 'disappearance', gone_seconds, gone_timeout)
+    saved_seconds = 0 if appeared else max(locator.timeout - appear_seconds, 0)
+    _wait_recorder.record_loading(saved_seconds, appeared)
+
+
+def record_settle(page_name, seconds, timeout, settled):
+    """Record how long a page took to settle (see `BasePage.wait_until_settled`)."""
+    if _wait_recorder is None:
+        return
+    label = '{}.settled'.format(page_name)
+    _wait_recorder.record(label, 'settled', seconds, timeout, failed=not settled)
+
+
+def record_cache(locator, attribute_name, hit):
+    """Record whether a page's element cache had a usable element for a locator."""
+    if _wait_recorder is None:
+        return
+    _wait_recorder.record_cache(locator_label(locator, attribute_name), hit)
+
+
+def record_wait(locator, attribute_name, condition):
+    """Record the time that each phase of an `element_to_be_ready` wait took."""
+    if _wait_recorder is None:
+        return
+    label = locator_label(locator, attribute_name)
+    for check, seconds in condition.durations.items():
+        _wait_recorder.record(label, WAIT_PHASES[check], seconds, locator.timeout)
+    if condition.failed:
+        _wait_recorder.record(
+            label,
+            WAIT_PHASES[condition.state],
+            condition.waited(),
+            locator.timeout,
+            failed=True,
+        )
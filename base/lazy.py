@@ -0,0 +1,21 @@
+class lazy_class_attribute(object):
+    """A class attribute whose value is only computed when it is first accessed.
+    The value is then cached on the class, so `func` is called at most once.
+
+    Use for class attributes that need the OSF api (e.g. the current user) so that
+    importing a page does not make any network requests.
+
+    :param func: A function with no arguments that returns the attribute's value.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.name = func.__name__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        value = self.func()
+        setattr(owner, self.name, value)
+        return value
@@ -1,13 +1,19 @@
+import time
+
 from selenium.common.exceptions import (
-    NoSuchElementException,
     StaleElementReferenceException,
     TimeoutException,
 )
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 import settings
 from base import expected_conditions as ec
+from base import instrumentation
+from base.waits import WebDriverWait
+
+
+# How often (in seconds) `here_then_gone` checks on a loading indicator
+LOADING_POLL_FREQUENCY = 0.1
 
 
 class WebElementWrapper:
@@ -17,12 +23,14 @@ class WebElementWrapper:
     :param driver: A selenium WebDriver.
     :param str attribute_name: The attribute name of the locator in its containing class.
     :param locator: An object of the type Locator.
+    :param cache: An ElementCache of the containing page, if it caches its elements.
     """
 
-    def __init__(self, driver, attribute_name, locator):
+    def __init__(self, driver, attribute_name, locator, cache=None):
         self.driver = driver
         self.locator = locator
         self.name = attribute_name
+        self.cache = cache
 
     def __getattr__(self, item):
         """If WebElementWrapper does not have an attribute, WebElement attributes are used.
@@ -35,6 +43,8 @@ class WebElementWrapper:
     @property
     def element(self):
         """Return the WebElement directly."""
+        if self.cache is not None:
+            return self.cache.get_web_element(self.driver, self.name, self.locator)
         return self.locator.get_web_element(self.driver, self.name)
 
     def present(self):
@@ -61,17 +71,43 @@ class WebElementWrapper:
         except TimeoutException:
             return False
 
-    def here_then_gone(self):
+    def here_then_gone(
+        self, appear_timeout=settings.LOADING_APPEAR_TIMEOUT, gone_timeout=None
+    ):
         """In theory, wait for an element to appear and then disappear.
         Often used to wait for loading indicators to disappear before
         continuing testing. Appearance is not mandatory as sometimes an
-        element may disappear faster than selenium can check for its presence.
+        element may disappear faster than selenium can check for its presence,
+        so it is only waited for for `appear_timeout` seconds. The element then
+        has `gone_timeout` seconds (by default the locator's timeout) to disappear.
 
-        :return: True if element disappears. False if timeout on waiting for disappearance.
+        :return: True if element disappears. Raises ValueError if it doesn't.
         """
-        self.present()
-        if not self.absent():
-            raise ValueError('Element {} is not absent.'.format(self.name))
+        gone_timeout = gone_timeout or self.locator.timeout
+        started = time.monotonic()
+        with instrumentation.locating(self.locator, self.name):
+            try:
+                WebDriverWait(
+                    self.driver, appear_timeout, poll_frequency=LOADING_POLL_FREQUENCY
+                ).until(EC.visibility_of_element_located(self.locator.location))
+                appeared = True
+            except TimeoutException:
+                appeared = False
+            appear_seconds = time.monotonic() - started
+            try:
+                WebDriverWait(
+                    self.driver, gone_timeout, poll_frequency=LOADING_POLL_FREQUENCY
+                ).until(EC.invisibility_of_element_located(self.locator.location))
+            except TimeoutException:
+                raise ValueError('Element {} is not absent.'.format(self.name))
+        instrumentation.record_loading(
+            self.locator,
+            self.name,
+            appeared,
+            appear_seconds,
+            time.monotonic() - started - appear_seconds,
+            gone_timeout,
+        )
         return True
 
     def click_expecting_popup(self, timeout=settings.TIMEOUT):
@@ -112,6 +148,63 @@ class WebElementWrapper:
             self.element.send_keys(k)
 
 
+class ElementCache:
+    """Remembers the WebElements that a page has located, so that accessing the same
+    locator again (e.g. `page.title.text` then `page.title.get_attribute(...)`) does
+    not wait for the element all over again.
+
+    A cached element is revalidated with a single script that checks it is still
+    visible and clickable. It is located again if that fails, if it has gone stale, or
+    if the page has navigated to a different url since.
+    """
+
+    def __init__(self):
+        self.elements = {}
+        self.url = None
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.elements.clear()
+        self.url = None
+
+    def revalidate(self, driver, attribute_name, locator, element):
+        """Return the cached element if it is still usable, otherwise None."""
+        try:
+            ready, url = driver.execute_script(
+                ec.ELEMENT_REVALIDATE_PROBE,
+                locator.selector,
+                locator.path,
+                element,
+                'href' in attribute_name,
+            )
+        except StaleElementReferenceException:
+            return None
+        if self.url is None:
+            self.url = url
+        elif url != self.url:
+            self.clear()
+            self.url = url
+            return None
+        if isinstance(ready, str):
+            return None
+        return element
+
+    def get_web_element(self, driver, attribute_name, locator):
+        element = self.elements.get(locator)
+        if element is not None:
+            with instrumentation.locating(locator, attribute_name):
+                element = self.revalidate(driver, attribute_name, locator, element)
+        instrumentation.record_cache(locator, attribute_name, element is not None)
+        if element is not None:
+            self.hits += 1
+            return element
+        self.misses += 1
+        element = locator.get_web_element(driver, attribute_name)
+        self.elements[locator] = element
+        return element
+
+
 class BaseLocator:
     """Abstract base class from which all Locator classes inherit.
 
@@ -126,9 +219,11 @@ class BaseLocator:
         self.location = (selector, path)
         self.timeout = timeout
 
-    def get_element(self, driver, attribute_name):
+    def get_element(self, driver, attribute_name, cache=None):
         """Must be implemented by every Locator subclass. Defines how a locator is used within
         a page (or element). Ultimately is a locator's return value when used in the PageObject model.
+
+        `cache` is the ElementCache of the containing page, or None if it doesn't cache elements.
         """
         raise NotImplementedError
 
@@ -139,76 +234,49 @@ class Locator(BaseLocator):
     :param selector: An instance of selenium By. Often `By.CSS_SELECTOR`.
     :param str path: String that uniquely identifies the element, dependant on selector.
     :param int timeout: How many seconds to wait when using a `WebDriverWait` in Locator methods
-    most notably `get_web_element`. You may end up waiting longer than your timeout because some
-    methods use more than one Wait.
+    most notably `get_web_element`. Waits are cut short by an active `Deadline`.
     """
 
+    # Error messages for `get_web_element`, keyed by the check that failed
+    failure_messages = {
+        'absent': 'Element {} not present on page. {}',
+        'hidden': 'Element {} not visible before timeout. {}',
+        'disabled': 'Element {} not clickable before timeout. {}',
+        'no_href': 'Element {} on page but does not have a href. {}',
+    }
+
     def get_web_element(self, driver, attribute_name):
         """
-        Check if element is on page and visible before returning the selenium
-        WebElement. If element is not found or visible raises `ValueError`.
+        Check if element is on page, visible and clickable before returning the
+        selenium WebElement. If element is not found or visible raises `ValueError`.
 
-        h/t to seleniumframework.com for the original structure of this method.
+        All of the checks are made by one script per poll, see
+        `expected_conditions.element_to_be_ready`. All of the checks together take at
+        most the locator's timeout (or what is left of the active deadline). Elements
+        whose attribute name contains 'href' must also have an href.
 
         :param driver: A selenium WebDriver.
         :param str attribute_name: The attribute name of the locator in its containing class.
         :return: The WebElement represented by the locator.
         """
+        condition = ec.element_to_be_ready(
+            self.location, check_href='href' in attribute_name, timeout=self.timeout
+        )
         try:
-            WebDriverWait(driver, self.timeout).until(
-                EC.presence_of_element_located(self.location)
-            )
-        except (TimeoutException, StaleElementReferenceException):
-            raise ValueError(
-                'Element {} not present on page. {}'.format(
-                    attribute_name, driver.current_url
-                )
-            ) from None
-
-        try:
-            WebDriverWait(driver, self.timeout).until(
-                EC.visibility_of_element_located(self.location)
-            )
-        except (TimeoutException, StaleElementReferenceException):
-            raise ValueError(
-                'Element {} not visible before timeout. {}'.format(
-                    attribute_name, driver.current_url
-                )
-            ) from None
-
-        try:
-            WebDriverWait(driver, self.timeout).until(
-                EC.element_to_be_clickable(self.location)
-            )
+            with instrumentation.locating(self, attribute_name):
+                return WebDriverWait(driver, self.timeout).until(condition)
         except (TimeoutException, StaleElementReferenceException):
+            condition.failed = True
             raise ValueError(
-                'Element {} not clickable before timeout. {}'.format(
+                self.failure_messages[condition.state].format(
                     attribute_name, driver.current_url
                 )
             ) from None
+        finally:
+            instrumentation.record_wait(self, attribute_name, condition)
 
-        if 'href' in attribute_name:
-            try:
-                WebDriverWait(driver, self.timeout).until(
-                    ec.link_has_href(self.location)
-                )
-            except (TimeoutException, StaleElementReferenceException):
-                raise ValueError(
-                    'Element {} on page but does not have a href. {}'.format(
-                        attribute_name, driver.current_url
-                    )
-                ) from None
-        try:
-            return driver.find_element(self.selector, self.path)
-        except NoSuchElementException:
-            raise ValueError(
-                'Element {} was present, but now is gone. {}'.format(
-                    attribute_name, driver.current_url
-                )
-            ) from None
-
-    def get_element(self, driver, attribute_name):
-        return WebElementWrapper(driver, attribute_name, self)
+    def get_element(self, driver, attribute_name, cache=None):
+        return WebElementWrapper(driver, attribute_name, self, cache)
 
 
 class GroupLocator(BaseLocator):
@@ -222,7 +290,7 @@ class GroupLocator(BaseLocator):
     def get_web_elements(self, driver):
         return driver.find_elements(self.selector, self.path)
 
-    def get_element(self, driver, attribute_name=None):
+    def get_element(self, driver, attribute_name=None, cache=None):
         """Return a list of WebElements. Return empty list if none fitting locator criteria are found."""
         return self.get_web_elements(driver)
 
@@ -245,7 +313,7 @@ class ComponentLocator(Locator):
         super().__init__(selector, path, timeout)
         self.component_class = component_class
 
-    def get_element(self, driver, attribute_name=None):
+    def get_element(self, driver, attribute_name=None, cache=None):
         return self.component_class(driver)
 
 
@@ -253,9 +321,14 @@ class BaseElement:
     """Abstract base class from which all Element and eventually Page classes inherit.
     Handles waffled pages, storage of the WebDriver, and returning WebElements when Locators are
     accessed.
+
+    Set `cache_elements = True` on a subclass to reuse the WebElements it locates while
+    they stay valid, see `ElementCache`.
     """
 
     default_timeout = settings.TIMEOUT
+    cache_elements = False
+    element_cache = None
 
     def __new__(cls, *args, **kwargs):
         """Check if an element or page has a waffle version. If waffle is on,
@@ -278,6 +351,8 @@ class BaseElement:
 
     def __init__(self, driver):
         self.driver = driver
+        if self.cache_elements:
+            self.element_cache = ElementCache()
 
     def verify(self):
         raise NotImplementedError
@@ -288,5 +363,10 @@ class BaseElement:
         """
         value = object.__getattribute__(self, attribute_name)
         if isinstance(value, BaseLocator):
-            return value.get_element(self.driver, attribute_name)
+            with instrumentation.locating(
+                value, attribute_name, owner=type(self).__name__
+            ):
+                return value.get_element(
+                    self.driver, attribute_name, self.element_cache
+                )
         return value
@@ -0,0 +1,266 @@
+"""Wait for conditions inside the page instead of polling them from here.
+
+Selenium's WebDriverWait checks its condition every 0.5s, and every check is at least
+one WebDriver command (a round trip to the browser, which is slow over BrowserStack).
+The conditions that can be checked with a script are instead waited on by one async
+script (`expected_conditions.WAIT_SCRIPT`), which checks the condition whenever the DOM
+changes and returns as soon as it holds. Conditions that can't be checked in the page
+(i.e. the number of windows) are polled as before.
+
+Composite operations (i.e. navigating to a page and verifying it) can be given one
+overall time budget with a `Deadline`. While a deadline is active, every wait made in
+the same thread is cut short to the time that is left of it (see `capped`), so a
+failing test fails once its budget is spent rather than after a timeout per wait.
+"""
+
+import math
+import threading
+import time
+
+from selenium.common.exceptions import (
+    JavascriptException,
+    TimeoutException,
+    WebDriverException,
+)
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support import ui
+
+import settings
+from base import expected_conditions as ec
+
+
+# How long (in ms) `wait_until_stable` waits for a result to stop changing
+STABLE_FOR = 250
+# Tells `wait_until_stable` that no `changed_from` value was given
+NOT_SET = object()
+
+# Longest that one async script waits for, so that it always finishes well within the
+# driver's script timeout (30 seconds by default). Longer waits use several scripts.
+MAX_SCRIPT_WAIT = 20
+
+_local = threading.local()
+
+
+class WaitScriptError(WebDriverException):
+    """The condition's script failed in the page."""
+
+
+class Deadline:
+    """A budget of `seconds` for a composite operation, starting now. Use it as a
+    context manager to make it cap the waits made within it. When deadlines are
+    nested, the earliest one applies.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.end_time = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(self.end_time - time.monotonic(), 0)
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.end_time
+
+    def cap(self, timeout):
+        """Return `timeout`, or the time that is left if that is less."""
+        return min(timeout, self.remaining())
+
+    def __enter__(self):
+        deadlines = _deadlines()
+        deadlines.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _deadlines().remove(self)
+
+
+def _deadlines():
+    if not hasattr(_local, 'deadlines'):
+        _local.deadlines = []
+    return _local.deadlines
+
+
+def current_deadline():
+    """Return the earliest active deadline of this thread, or None."""
+    return min(_deadlines(), key=lambda deadline: deadline.end_time, default=None)
+
+
+def capped(timeout):
+    """Return `timeout`, cut short to what is left of the active deadline."""
+    deadline = current_deadline()
+    return timeout if deadline is None else deadline.cap(timeout)
+
+
+class DomCondition:
+    """A condition checked in the page by `script`, the body of a function that is
+    called with `args` and returns false until the condition holds.
+    """
+
+    unwanted = [False]
+
+    def __init__(self, script, *args):
+        self.script = script
+        self.args = args
+
+    def time_left(self):
+        return None
+
+    def update(self, result):
+        return result
+
+    def __call__(self, driver):
+        # For drivers that can't wait in the page
+        return self.update(driver.execute_script(self.script, *self.args))
+
+
+# Scripts for selenium's expected conditions, called with the locator's strategy and
+# path (and any other arguments of the condition)
+PRESENCE_SCRIPT = (
+    ec.DOM_HELPERS + 'return findElement(arguments[0], arguments[1]) || false;'
+)
+VISIBILITY_SCRIPT = (
+    ec.DOM_HELPERS
+    + """
+var el = findElement(arguments[0], arguments[1]);
+return el && isShown(el) ? el : false;
+"""
+)
+CLICKABLE_SCRIPT = (
+    ec.DOM_HELPERS
+    + """
+var el = findElement(arguments[0], arguments[1]);
+return el && isShown(el) && !el.matches(':disabled') ? el : false;
+"""
+)
+INVISIBILITY_SCRIPT = (
+    ec.DOM_HELPERS
+    + """
+var el = findElement(arguments[0], arguments[1]);
+return !el || !isShown(el);
+"""
+)
+TEXT_SCRIPT = (
+    ec.DOM_HELPERS
+    + """
+var el = findElement(arguments[0], arguments[1]);
+return !!el && (el.innerText || el.textContent).indexOf(arguments[2]) !== -1;
+"""
+)
+
+LOCATOR_SCRIPTS = {
+    EC.presence_of_element_located: PRESENCE_SCRIPT,
+    EC.visibility_of_element_located: VISIBILITY_SCRIPT,
+    EC.element_to_be_clickable: CLICKABLE_SCRIPT,
+}
+
+
+def dom_condition(condition):
+    """Return the given condition as one that can be waited on in the page, or None
+    if it can't be.
+    """
+    if isinstance(condition, DomCondition):
+        return condition
+    if isinstance(condition, ec.element_to_be_ready):
+        return condition if condition.script else None
+    locator = getattr(condition, 'locator', None)
+    if isinstance(condition, EC.invisibility_of_element_located):
+        # Can also be given a WebElement, which is polled
+        locator = condition.target
+    if not isinstance(locator, tuple) or locator[0] not in ec.JS_STRATEGIES:
+        return None
+    condition_class = type(condition)
+    if condition_class in LOCATOR_SCRIPTS:
+        return DomCondition(LOCATOR_SCRIPTS[condition_class], *locator)
+    if condition_class is EC.invisibility_of_element_located:
+        return DomCondition(INVISIBILITY_SCRIPT, *locator)
+    if condition_class is EC.text_to_be_present_in_element:
+        return DomCondition(TEXT_SCRIPT, locator[0], locator[1], condition.text)
+    return None
+
+
+def wait_in_page(driver, condition, timeout):
+    """Wait up to `timeout` seconds, in a single async script, for the result of the
+    condition's script to no longer be one of its unwanted results. Returns the last
+    result.
+    """
+    result = driver.execute_async_script(
+        ec.WAIT_SCRIPT % condition.script,
+        list(condition.args),
+        condition.unwanted,
+        max(math.ceil(timeout * 1000), 0),
+    )
+    if isinstance(result, dict) and 'waitError' in result:
+        raise WaitScriptError(result['waitError'])
+    return result
+
+
+def wait_until_stable(
+    driver,
+    script,
+    *args,
+    stable_for=STABLE_FOR,
+    timeout=settings.QUICK_TIMEOUT,
+    changed_from=NOT_SET,
+):
+    """Wait, in a single async script, until the result of `script` (the body of a
+    function that is called with `args` and returns a json value) has stopped changing
+    for `stable_for` ms, and return it. With `changed_from`, the result must also have
+    changed from that value first. Raises TimeoutException if it doesn't settle within
+    `timeout` seconds (or what is left of the active deadline).
+    """
+    stable, result = driver.execute_async_script(
+        ec.STABLE_SCRIPT % script,
+        list(args),
+        stable_for,
+        max(math.ceil(min(capped(timeout), MAX_SCRIPT_WAIT) * 1000), 0),
+        None if changed_from is NOT_SET else changed_from,
+        changed_from is not NOT_SET,
+    )
+    if isinstance(result, dict) and 'waitError' in result:
+        raise WaitScriptError(result['waitError'])
+    if not stable:
+        raise TimeoutException(
+            'Result did not stay the same for {}ms: {!r}'.format(stable_for, result)
+        )
+    return result
+
+
+class WebDriverWait(ui.WebDriverWait):
+    """Drop-in replacement for selenium's WebDriverWait that waits inside the page for
+    the conditions that `dom_condition` can check there, and polls for the rest. The
+    timeout is cut short to what is left of the active `Deadline`, if any.
+    """
+
+    def __init__(self, driver, timeout, *args, **kwargs):
+        super().__init__(driver, capped(timeout), *args, **kwargs)
+
+    def until(self, method, message=''):
+        condition = dom_condition(method)
+        if condition is None or not hasattr(self._driver, 'execute_async_script'):
+            return super().until(method, message)
+
+        # The script fails with a javascript error when the page navigates away while
+        # it waits, in which case it is run again on the new page
+        retried = (JavascriptException,) + tuple(self._ignored_exceptions)
+        last_error = None
+        end_time = time.monotonic() + self._timeout
+        while True:
+            timeout = min(end_time - time.monotonic(), MAX_SCRIPT_WAIT)
+            time_left = condition.time_left()
+            if time_left is not None:
+                timeout = min(timeout, time_left)
+            try:
+                value = condition.update(wait_in_page(self._driver, condition, timeout))
+                if value:
+                    return value
+            except TimeoutException:
+                raise TimeoutException(message) from last_error
+            except WaitScriptError:
+                raise
+            except retried as exc:
+                last_error = exc
+                time.sleep(self._poll)
+            if time.monotonic() > end_time:
+                break
+        raise TimeoutException(message) from last_error
@@ -1,5 +1,3 @@
-from time import sleep
-
 from selenium.webdriver.common.by import By
 
 import settings
@@ -8,6 +6,25 @@ from base.locators import (
     GroupLocator,
     Locator,
 )
+from base.waits import wait_until_stable
+
+
+# How long (in ms) the ember quicksearch list has to stay the same to be done
+# filtering: longer than the search input waits for typing to pause before it
+# searches, so that a search that hasn't started yet isn't taken for a finished one
+EMBER_QUICK_SEARCH_STABLE_FOR = 750
+
+# The hrefs of the project links of the quicksearch list, or null while the list's
+# loading item (arguments[1]) is shown
+PROJECT_LINKS_SCRIPT = """
+if (arguments[1] && document.querySelector(arguments[1])) {
+    return null;
+}
+var links = document.querySelectorAll(arguments[0]);
+return Array.prototype.map.call(links, function (link) {
+    return link.getAttribute('href');
+});
+"""
 
 
 class EmberCreateProjectModal(BaseElement):
@@ -81,9 +98,27 @@ class EmberProjectList(BaseElement):
         raise ValueError('Dashboard page is still loading.')
 
     def get_list_length(self):
-        if self.loading_dashboard_item.here_then_gone():
-            return len(self.project_list_projects)
-        raise ValueError('Dashboard page is still loading.')
+        # Let quicksearch finish searching and loading the list
+        links_args = (
+            type(self).project_list_projects.path,
+            '.' + type(self).loading_dashboard_item.path,
+        )
+        project_links = wait_until_stable(
+            self.driver,
+            PROJECT_LINKS_SCRIPT,
+            *links_args,
+            stable_for=EMBER_QUICK_SEARCH_STABLE_FOR,
+        )
+        while project_links is None:
+            # Raises ValueError if the list doesn't finish loading
+            self.loading_dashboard_item.here_then_gone()
+            project_links = wait_until_stable(
+                self.driver,
+                PROJECT_LINKS_SCRIPT,
+                *links_args,
+                stable_for=EMBER_QUICK_SEARCH_STABLE_FOR,
+            )
+        return len(project_links)
 
 
 class CreateProjectModal(BaseElement):
@@ -183,5 +218,10 @@ class ProjectList(BaseElement):
             raise ValueError('Unable to find a project at position {}'.format(n))
 
     def get_list_length(self):
-        sleep(0.4)  # Need sleep to let quicksearch do its thing
-        return len(self.project_list_projects)
+        # Let quicksearch finish filtering the list
+        project_links = wait_until_stable(
+            self.driver,
+            PROJECT_LINKS_SCRIPT,
+            type(self).project_list_projects.path,
+        )
+        return len(project_links)
@@ -1,4 +1,11 @@
+import datetime
+import email
 import imaplib
+import select
+import ssl
+import time
+
+import settings
 
 
 def get_latest_email_body_by_imap(
@@ -59,6 +66,193 @@ def get_count_of_unseen_emails_by_imap(imap_host, email_address, password):
 #       or to return multiple emails.
 
 
+class MailWaiter:
+    """Wait for new emails over one persistent, logged in IMAP connection.
+
+    Create the waiter (or call `mark`) before triggering the email so that only
+    messages that arrive afterwards (by UID) are matched. Uses IMAP IDLE to be told
+    about new messages as they arrive when the server supports it, and otherwise polls
+    with a backoff. Use as a context manager to log out when done:
+
+        with MailWaiter(settings.IMAP_HOST, email, password) as waiter:
+            ...  # trigger the email
+            message = waiter.wait_for('SUBJECT', 'Confirm account merge')
+
+    `imap_factory` is called with the host to create the connection, so a plain
+    `imaplib.IMAP4` (i.e. a local IMAP server) can be used instead of IMAP4_SSL.
+    """
+
+    # Servers drop IDLE after 30 minutes, but re-issuing it more often also lets the
+    # deadline be checked regularly
+    idle_timeout = 10
+    poll_interval = 0.5
+    max_poll_interval = 5
+
+    def __init__(
+        self,
+        imap_host,
+        email_address,
+        password,
+        mailbox='Inbox',
+        imap_factory=imaplib.IMAP4_SSL,
+    ):
+        self.imap_host = imap_host
+        self.email_address = email_address
+        self.password = password
+        self.mailbox = mailbox
+        self.imap_factory = imap_factory
+        self.imap = None
+        self.last_uid = 0
+        self.since = None
+        self._idle_tags = 0
+        self.mark()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def connect(self):
+        self.imap = self.imap_factory(self.imap_host)
+        self.imap.login(self.email_address, self.password)
+        self.imap.select(self.mailbox)
+
+    def close(self):
+        if self.imap is None:
+            return
+        try:
+            imap_close(self.imap)
+        except (imaplib.IMAP4.error, OSError):
+            pass
+        self.imap = None
+
+    def mark(self):
+        """Only match messages that arrive after this point."""
+        if self.imap is None:
+            self.connect()
+        uids = self._search_uids('ALL')
+        self.last_uid = max(uids, default=0)
+        # SINCE only has a granularity of days, so go back one to be safe with time
+        # zones. It narrows the search on a large mailbox while UIDs do the real work.
+        self.since = datetime.date.today() - datetime.timedelta(days=1)
+
+    def wait_for(self, search_key=None, search_value=None, timeout=None):
+        """Wait for a message matching the search criteria (see `search`) to arrive
+        and return it as an `email.message.Message`. Raises TimeoutError if no such
+        message arrives before the timeout (in seconds).
+        """
+        deadline = time.monotonic() + (timeout or settings.VERY_LONG_TIMEOUT * 3)
+        poll_interval = self.poll_interval
+        while True:
+            try:
+                message = self._fetch_new_match(search_key, search_value)
+                if message is not None:
+                    return message
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if not self._idle(min(remaining, self.idle_timeout)):
+                    time.sleep(min(remaining, poll_interval))
+                    poll_interval = min(poll_interval * 2, self.max_poll_interval)
+            except (imaplib.IMAP4.abort, OSError):
+                # The server dropped the connection, so log in again and carry on
+                self.close()
+                if time.monotonic() >= deadline:
+                    break
+                self.connect()
+        raise TimeoutError(
+            'No email matching {} {} arrived in {}'.format(
+                search_key, search_value, self.mailbox
+            )
+        )
+
+    def _search_uids(self, *criteria):
+        response, data = self.imap.uid('SEARCH', None, *criteria)
+        return [int(uid) for uid in data[0].split()]
+
+    def _fetch_new_match(self, search_key, search_value):
+        criteria = [
+            'UID',
+            '{}:*'.format(self.last_uid + 1),
+            'SINCE',
+            self.since.strftime('%d-%b-%Y'),
+        ]
+        if search_key is not None:
+            criteria.append(search_key)
+        if search_value is not None:
+            criteria.append('"{}"'.format(search_value))
+        # 'n:*' always includes the newest message, even if its UID is below n
+        uids = [uid for uid in self._search_uids(*criteria) if uid > self.last_uid]
+        if not uids:
+            return None
+        self.last_uid = max(uids)
+        response, data = self.imap.uid('FETCH', str(self.last_uid), '(RFC822)')
+        return email.message_from_bytes(data[0][1])
+
+    def _idle(self, timeout):
+        """Wait in IMAP IDLE until the server reports a new message or the timeout
+        passes. Returns False if the server doesn't support IDLE.
+        """
+        if 'IDLE' not in self.imap.capabilities:
+            return False
+        self._idle_tags += 1
+        tag = 'IDLE{}'.format(self._idle_tags).encode()
+        self.imap.send(tag + b' IDLE\r\n')
+        if not self.imap.readline().startswith(b'+'):
+            return False
+        deadline = time.monotonic() + timeout
+        while True:
+            # Wait on the socket rather than setting a timeout on it, since a timed
+            # out read leaves imaplib's buffered reader unusable
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not self._has_buffered_data():
+                readable, _, _ = select.select([self.imap.socket()], [], [], remaining)
+                if not readable:
+                    break
+            if self._readline().rstrip().endswith(b'EXISTS'):
+                break
+        self.imap.send(b'DONE\r\n')
+        while not self._readline().startswith(tag):
+            pass
+        return True
+
+    def _readline(self):
+        line = self.imap.readline()
+        if not line:
+            raise imaplib.IMAP4.abort('Connection closed during IDLE')
+        return line
+
+    def _has_buffered_data(self):
+        """Return whether imaplib's reader (or the SSL layer) already holds data that
+        select can't see, i.e. a line that arrived along with the previous one.
+        """
+        sock = self.imap.socket()
+        timeout = sock.gettimeout()
+        # Only look at what is already there: a non-blocking read returns nothing
+        # rather than timing out, which would leave the reader unusable
+        sock.setblocking(False)
+        try:
+            return bool(self.imap.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            sock.settimeout(timeout)
+
+
+def get_message_body(message):
+    """Return the decoded text of every text part of an `email.message.Message`."""
+    parts = []
+    for part in message.walk():
+        if part.get_content_maintype() != 'text':
+            continue
+        payload = part.get_payload(decode=True) or b''
+        parts.append(payload.decode(part.get_content_charset() or 'utf-8', 'replace'))
+    return '\n'.join(parts)
+
+
 def imap_connect_and_login(imap_host, email_address, password):
     """Function to make SSL connection to IMP host and login with the given credentials
     Parameters:
@@ -1,5 +1,3 @@
-from time import sleep
-
 from selenium.webdriver.common.by import By
 
 import settings
@@ -7,6 +5,17 @@ from base.locators import (
     BaseElement,
     Locator,
 )
+from base.waits import (
+    DomCondition,
+    WebDriverWait,
+)
+
+
+# Whether the reCAPTCHA checkbox has been checked, from within its frame
+RECAPTCHA_CHECKED_SCRIPT = """
+var anchor = document.getElementById('recaptcha-anchor');
+return !!anchor && anchor.getAttribute('aria-checked') === 'true';
+"""
 
 
 class SignUpForm(BaseElement):
@@ -32,5 +41,8 @@ class SignUpForm(BaseElement):
             Locator(By.CSS_SELECTOR, '.recaptcha-checkbox-border').get_element(
                 self.driver, 'capcha'
             ).click()
+        # Wait for the checkbox to be checked before leaving its frame
+        WebDriverWait(self.driver, settings.TIMEOUT).until(
+            DomCondition(RECAPTCHA_CHECKED_SCRIPT)
+        )
         self.driver.switch_to.default_content()
-        sleep(2)
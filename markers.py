@@ -6,6 +6,8 @@ import settings
 two_minute_drill = pytest.mark.two_minute_drill
 smoke_test = pytest.mark.smoke_test
 core_functionality = pytest.mark.core_functionality
+# Use a new project instead of a pooled one (see api/project_pool.py)
+fresh_project = pytest.mark.fresh_project
 dont_run_on_prod = pytest.mark.skipif(
     settings.PRODUCTION, reason='Test should not run on production'
 )
@@ -1,12 +1,19 @@
+import time
 import urllib.parse
-from time import sleep
+from contextlib import nullcontext
 from urllib.parse import quote
 
-from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    TimeoutException,
+    WebDriverException,
+)
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.common.by import By
 
 import settings
+from base import expected_conditions as ec
+from base import instrumentation
 from base.exceptions import (
     HttpError,
     PageException,
@@ -15,9 +22,54 @@ from base.locators import (
     BaseElement,
     ComponentLocator,
 )
+from base.waits import (
+    Deadline,
+    DomCondition,
+    WebDriverWait,
+    capped,
+    wait_until_stable,
+)
 from components.navbars import HomeNavbar
 
 
+# How long (in ms) the page must stay settled for `wait_until_settled`
+SETTLED_QUIET_PERIOD = 50
+# The state of a drop target that a drop is expected to change
+DROP_TARGET_STATE_SCRIPT = 'return [arguments[0].className, arguments[0].textContent];'
+
+# Pages that are shown instead of the expected page when it can't be shown, by name
+# (these are also the identities of the page classes for them). `check_page` stops
+# waiting for a page's identity as soon as one of them is shown.
+ERROR_PAGES = {
+    'error': (By.CSS_SELECTOR, 'h2#error'),
+    'CAS error': (By.CLASS_NAME, 'login-error-card'),
+    'registration tombstone': (
+        By.CSS_SELECTOR,
+        'div[data-analytics-scope="Tombstone page"]',
+    ),
+    'not found': (By.CSS_SELECTOR, '[data-analytics-scope="404"]'),
+}
+# Returns 'identity' once the element of the locator given as the first two arguments
+# is shown, or the name of the first of the [name, strategy, path] error pages given as
+# the third argument that is shown, or false if neither is
+IDENTITY_OR_ERROR_SCRIPT = (
+    ec.DOM_HELPERS
+    + """
+var identity = findElement(arguments[0], arguments[1]);
+if (identity && isShown(identity)) {
+    return 'identity';
+}
+for (var i = 0; i < arguments[2].length; i++) {
+    var error = findElement(arguments[2][i][1], arguments[2][i][2]);
+    if (error && isShown(error)) {
+        return arguments[2][i][0];
+    }
+}
+return false;
+"""
+)
+
+
 class BasePage(BaseElement):
     url = None
 
@@ -27,28 +79,31 @@ class BasePage(BaseElement):
         if verify:
             self.check_page()
 
-    def goto(self, expect_redirect_to=None):
+    def goto(self, expect_redirect_to=None, deadline=None):
         """Navigate to a page based on its `url` attribute
         and confirms you are on the expected page.
 
         If you are not actually expecting to end up on the page you attempt to `goto`
         (for example when testing permissions) you can set `expect_redirect_to` equal to
         any BasePage class and it will be verified you wind up on that page instead.
-        """
 
-        self.driver.get(self.url)
+        `deadline` (a `base.waits.Deadline`) bounds the whole navigation, including
+        `check_page`, which has its own budget otherwise.
+        """
+        with deadline or nullcontext():
+            self.driver.get(self.url)
 
-        if expect_redirect_to:
-            if (
-                self.url not in self.driver.current_url
-                and quote(self.url, safe='') not in self.driver.current_url
-            ):
-                raise PageException(
-                    'Unexpected url structure: `{}`'.format(self.driver.current_url)
-                )
-            expect_redirect_to(self.driver, verify=True)
-        else:
-            self.check_page()
+            if expect_redirect_to:
+                if (
+                    self.url not in self.driver.current_url
+                    and quote(self.url, safe='') not in self.driver.current_url
+                ):
+                    raise PageException(
+                        'Unexpected url structure: `{}`'.format(self.driver.current_url)
+                    )
+                expect_redirect_to(self.driver, verify=True)
+            else:
+                self.check_page()
 
     def goto_with_reload(self):
         """An extension of the goto method above to be used in instances where the first attempt
@@ -66,14 +121,64 @@ class BasePage(BaseElement):
             self.reload()
             self.goto()
 
-    def check_page(self):
-        if not self.verify():
+    def check_page(self, deadline=None):
+        """Wait for the page to settle and verify it, all within `deadline`. By default
+        that is the settling timeout plus the timeout of the page's identity, so a page
+        that isn't the expected one fails in bounded time however it verifies itself.
+        """
+        if deadline is None:
+            seconds = self.verify_timeout()
+            if settings.WAIT_FOR_SETTLED:
+                seconds += settings.QUICK_TIMEOUT
+            deadline = Deadline(seconds)
+        with deadline:
+            if settings.WAIT_FOR_SETTLED:
+                self.wait_until_settled()
+            error_page = self.wait_for_identity_or_error()
+            verified = error_page is None and self.verify()
+        if not verified:
             # handle any specific kind of error before go to page exception
             self.error_handling()
             raise PageException(
-                'Unexpected page structure: `{}`'.format(self.driver.current_url)
+                'Unexpected page structure{}: `{}`'.format(
+                    ' ({} page)'.format(error_page) if error_page else '',
+                    self.driver.current_url,
+                )
             )
 
+    def wait_for_identity_or_error(self):
+        """Wait, in the page, for either the page's identity or one of the
+        `ERROR_PAGES` to be shown, so that an error page fails verification right
+        away instead of after the identity's timeout.
+
+        :return: The name of the error page that was shown, or None if the identity
+        was shown first, neither was, or the identity can't be waited on in the page.
+        """
+        identity = getattr(type(self), 'identity', None)
+        location = getattr(identity, 'location', None)
+        if location is None or location[0] not in ec.JS_STRATEGIES:
+            return None
+        error_pages = [
+            [name, by, path]
+            for name, (by, path) in ERROR_PAGES.items()
+            if (by, path) != location
+        ]
+        try:
+            shown = WebDriverWait(self.driver, identity.timeout).until(
+                DomCondition(IDENTITY_OR_ERROR_SCRIPT, *location, error_pages)
+            )
+        except WebDriverException:
+            # Including timeouts, which verify() reports
+            return None
+        return None if shown == 'identity' else shown
+
+    def verify_timeout(self):
+        """Return the time budget of `check_page`: the timeout of the page's identity,
+        or the default timeout for pages that verify themselves another way.
+        """
+        identity = getattr(type(self), 'identity', None)
+        return getattr(identity, 'timeout', self.default_timeout)
+
     def verify(self):
         """Verify that you are on the expected page by confirming the page's `identity`
         element is present on the page.
@@ -85,6 +190,29 @@ class BasePage(BaseElement):
 
     def reload(self):
         self.driver.refresh()
+        if settings.WAIT_FOR_SETTLED:
+            self.wait_until_settled()
+
+    def wait_until_settled(self, timeout=settings.QUICK_TIMEOUT):
+        """Wait for the page to finish loading: no requests in flight and Ember done
+        rendering, see `expected_conditions.SETTLED_SCRIPT`. Waits in the browser
+        with a single command rather than polling from here.
+
+        :return: True if the page settled, False if it didn't within `timeout` seconds
+        (e.g. it keeps polling the api) or navigated away while waiting.
+        """
+        timeout = capped(timeout)
+        started = time.monotonic()
+        try:
+            settled = self.driver.execute_async_script(
+                ec.SETTLED_SCRIPT, int(timeout * 1000), SETTLED_QUIET_PERIOD
+            )
+        except WebDriverException:
+            settled = False
+        instrumentation.record_settle(
+            type(self).__name__, time.monotonic() - started, timeout, settled
+        )
+        return settled
 
     def scroll_into_view(self, element):
         self.driver.execute_script('arguments[0].scrollIntoView(false);', element)
@@ -92,10 +220,25 @@ class BasePage(BaseElement):
         self.driver.execute_script('window.scrollBy(0, 55)')
 
     def drag_and_drop(self, source_element, dest_element):
+        """Drag an element onto another one, and wait for the drop target to change.
+
+        :return: True if the drop target changed, False if it didn't.
+        """
+        dest_element = getattr(dest_element, 'element', dest_element)
         source_element.click()
+        before = self.driver.execute_script(DROP_TARGET_STATE_SCRIPT, dest_element)
         ActionChains(self.driver).drag_and_drop(source_element, dest_element).perform()
         # Note: If you close the browser too quickly, the drag/drop may not go through
-        sleep(1)
+        try:
+            wait_until_stable(
+                self.driver,
+                DROP_TARGET_STATE_SCRIPT,
+                dest_element,
+                changed_from=before,
+            )
+        except TimeoutException:
+            return False
+        return True
 
 
 class OSFBasePage(BasePage):
@@ -111,7 +254,7 @@ class OSFBasePage(BasePage):
 
     def find_error_heading_element(self):
         try:
-            error_head = self.driver.find_element(By.CSS_SELECTOR, 'h2#error')
+            error_head = self.driver.find_element(*ERROR_PAGES['error'])
         except NoSuchElementException:
             return None
         else:
@@ -1,3 +1,8 @@
+import time
+import urllib.parse
+from html.parser import HTMLParser
+
+import requests
 from selenium.webdriver.common.by import By
 
 import settings
@@ -10,6 +15,23 @@ from pages.base import (
     BasePage,
     OSFBasePage,
 )
+from utils import (
+    ANONYMOUS,
+    UNKNOWN,
+    get_identity,
+    goto_osf_origin,
+    session_cookie_name,
+    set_identity,
+)
+
+
+# How long to reuse a session cookie that doesn't have an expiry date, in seconds
+LOGIN_COOKIE_MAX_AGE = 30 * 60
+# Don't reuse a cookie that expires within this many seconds
+LOGIN_COOKIE_EXPIRY_MARGIN = 60
+
+# user -> (selenium cookie dict, time after which it shouldn't be reused)
+_login_cookies = {}
 
 
 class LoginPage(BasePage):
@@ -157,15 +179,135 @@ def login(driver, user=settings.USER_ONE, password=settings.USER_ONE_PASSWORD):
     login_page = LoginPage(driver)
     login_page.goto()
     login_page.submit_login(user, password)
+    # Not known until the login has been checked, but the browser is now logged in
+    # to CAS
+    set_identity(driver, UNKNOWN, cas=True)
 
 
 def safe_login(driver, user=settings.USER_ONE, password=settings.USER_ONE_PASSWORD):
-    """Raise a LoginError if login fails."""
+    """Raise a LoginError if login fails. Does nothing if the driver is already
+    logged in as the user.
+
+    With FAST_LOGIN this injects the user's OSF session cookie instead of using the
+    login form, so no page is loaded: the user is logged in from the next page load.
+    """
+    if get_identity(driver) == user:
+        return
+    if settings.FAST_LOGIN and 'localhost:5000' not in settings.OSF_HOME:
+        cookie_login(driver, user=user, password=password)
+        return
     login(driver, user=user, password=password)
     if not OSFBasePage(driver).is_logged_in():
         raise LoginError('Login failed')
+    cookie = driver.get_cookie(session_cookie_name())
+    set_identity(driver, user, cookie=cookie['value'] if cookie else None)
+
+
+def cookie_login(driver, user=settings.USER_ONE, password=settings.USER_ONE_PASSWORD):
+    """Log the browser in by adding the OSF session cookie of the given user."""
+    cookie = get_login_cookie(user, password)
+    goto_osf_origin(driver)
+    driver.add_cookie(cookie)
+    set_identity(driver, user, cookie=cookie['value'])
+
+
+def get_login_cookie(user, password):
+    """Return the OSF session cookie (as a selenium cookie dict) for the given user,
+    reusing a cached cookie while it is unexpired.
+
+    A cached cookie is reused without checking it with the api: its session only ends
+    when it expires, or when the browser using it logs out, which drops it from the
+    cache (see `logout`). Only a cookie from a new login is checked.
+    """
+    cookie, reuse_until = _login_cookies.get(user, (None, 0))
+    if cookie is None or time.time() > reuse_until:
+        cookie = _cas_login(user, password)
+        if not _is_logged_in(cookie):
+            raise LoginError('Login failed for {}'.format(user))
+        reuse_until = cookie.get('expiry') or time.time() + LOGIN_COOKIE_MAX_AGE
+        _login_cookies[user] = (cookie, reuse_until - LOGIN_COOKIE_EXPIRY_MARGIN)
+    return cookie
+
+
+def _is_logged_in(cookie):
+    response = requests.get(
+        settings.API_DOMAIN + '/v2/users/me/',
+        cookies={cookie['name']: cookie['value']},
+        timeout=settings.TIMEOUT,
+    )
+    return response.status_code == 200
+
+
+class _LoginFormParser(HTMLParser):
+    """Find the action and the hidden inputs (e.g. CAS's `execution` token) of the
+    CAS login form.
+    """
+
+    form_ids = ('fm1', 'loginForm')
+
+    def __init__(self):
+        super().__init__()
+        self.found = False
+        self.in_form = False
+        self.action = ''
+        self.hidden = {}
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'form' and attrs.get('id') in self.form_ids and not self.found:
+            self.found = self.in_form = True
+            self.action = attrs.get('action') or ''
+        elif (
+            tag == 'input'
+            and self.in_form
+            and (attrs.get('type') or '').lower() == 'hidden'
+            and attrs.get('name')
+        ):
+            self.hidden[attrs['name']] = attrs.get('value') or ''
+
+    def handle_endtag(self, tag):
+        if tag == 'form':
+            self.in_form = False
+
+
+def _cas_login(user, password):
+    """Log in with the CAS login form over http and return the OSF session cookie
+    that is set when CAS redirects back to OSF. Raise a LoginError if login fails.
+    """
+    http = requests.Session()
+    response = http.get(settings.OSF_HOME + '/login', timeout=settings.LONG_TIMEOUT)
+    form = _LoginFormParser()
+    form.feed(response.text)
+    if not form.found:
+        raise LoginError('Could not find the CAS login form')
+    post_url = urllib.parse.urljoin(response.url, form.action)
+    data = dict(form.hidden)
+    data.update({'username': user, 'password': password})
+    http.post(post_url, data=data, timeout=settings.LONG_TIMEOUT)
+
+    for cookie in http.cookies:
+        if cookie.name == session_cookie_name():
+            selenium_cookie = {
+                'name': cookie.name,
+                'value': cookie.value,
+                'domain': cookie.domain,
+                'path': cookie.path,
+                'secure': cookie.secure,
+            }
+            if cookie.expires:
+                selenium_cookie['expiry'] = cookie.expires
+            return selenium_cookie
+    raise LoginError('Login failed for {}'.format(user))
 
 
 def logout(driver):
     """Log the user out."""
+    # The logout ends the server side session, so its cookie can't be reused
+    cookie = driver.get_cookie(session_cookie_name())
+    if cookie:
+        for user, (cached, _) in list(_login_cookies.items()):
+            if cached['value'] == cookie['value']:
+                del _login_cookies[user]
     driver.get(settings.OSF_HOME + '/logout/')
+    # Logging out of OSF also logs out of CAS
+    set_identity(driver, ANONYMOUS, cas=False)
@@ -259,6 +259,7 @@ class BrandedPreprintsDiscoverPage(BasePreprintPage):
 
 
 class PreprintDetailPage(GuidBasePage, BasePreprintPage):
+    cache_elements = True
     url_base = urljoin(settings.OSF_HOME, '{guid}')
     identity = Locator(
         By.CSS_SELECTOR,
@@ -9,6 +9,7 @@ from selenium.webdriver.common.by import By
 
 import settings
 from api import osf_api
+from base.lazy import lazy_class_attribute
 from base.locators import (
     ComponentLocator,
     GroupLocator,
@@ -42,6 +43,7 @@ from pages.base import (
 
 
 class ProjectPage(GuidBasePage):
+    cache_elements = True
 
     identity = Locator(By.ID, 'projectScope')
     title = Locator(By.ID, 'nodeTitleEditable', settings.LONG_TIMEOUT)
@@ -402,7 +404,7 @@ class FilesPage(GuidBasePage):
             raise ValueError('No GUID or Addon Provider specified in base_url.')
 
     identity = Locator(By.CSS_SELECTOR, '[data-test-file-search]')
-    session = osf_api.get_default_session()
+    session = lazy_class_attribute(osf_api.get_default_session)
     alert_info_message = Locator(By.CSS_SELECTOR, 'div._banner_1acc8u > p')
     leave_vol_button = Locator(By.CSS_SELECTOR, '[data-test-view-normally]')
     file_rows = GroupLocator(By.CSS_SELECTOR, '[data-test-file-list-item]')
@@ -79,6 +79,7 @@ class BaseSubmittedRegistrationPage(GuidBasePage):
 class RegistrationDetailPage(BaseSubmittedRegistrationPage):
     """This is the Registration Overview Page"""
 
+    cache_elements = True
     identity = Locator(
         By.CSS_SELECTOR, '[data-test-page-heading]', settings.LONG_TIMEOUT
     )
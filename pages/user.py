@@ -2,6 +2,7 @@ from selenium.webdriver.common.by import By
 
 import settings
 from api import osf_api
+from base.lazy import lazy_class_attribute
 from base.locators import (
     ComponentLocator,
     GroupLocator,
@@ -25,10 +26,10 @@ from pages.base import (
 
 
 class UserProfilePage(GuidBasePage):
-    user = osf_api.current_user()
+    user = lazy_class_attribute(osf_api.current_user)
 
-    def __init__(self, driver, verify=False, guid=user.id):
-        super().__init__(driver, verify, guid)
+    def __init__(self, driver, verify=False, guid=None):
+        super().__init__(driver, verify, guid or self.user.id)
 
     # TODO: Reconsider using a component here (and using component locators correctly)
     identity = Locator(By.CLASS_NAME, 'profile-fullname', settings.LONG_TIMEOUT)
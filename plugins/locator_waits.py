@@ -0,0 +1,189 @@
+"""Find the locators that are slowest to wait for.
+
+With `--store-locator-waits`, every time a locator waits for its element (see
+`Locator.get_web_element`) the time spent waiting for the element to be present, then
+visible, then clickable is recorded in a histogram per locator
+(`PageClass.attribute_name`) and phase. The histograms are added to the ones kept in
+a local store (a json file) so that they build up across runs, and the slowest
+locators, and those that often come close to their timeout, are reported at the end
+of the session, along with how often the pages' element caches (see `ElementCache`)
+saved locating an element again.
+"""
+
+import json
+import os
+
+from base import instrumentation
+
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+DEFAULT_STORE_PATH = '.locator_waits.json'
+# Number of locators to list in each part of the report
+REPORT_SIZE = 10
+# Report locators whose waits come near their timeout at least this often
+NEAR_TIMEOUT_RATE = 0.1
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('locator waits')
+    group.addoption(
+        '--store-locator-waits',
+        action='store_true',
+        default=False,
+        help='Record how long each locator waits for its element and report the '
+        'slowest ones.',
+    )
+    group.addoption(
+        '--locator-waits-path',
+        default=DEFAULT_STORE_PATH,
+        help='Path of the locator waits store. Default: {}'.format(DEFAULT_STORE_PATH),
+    )
+
+
+def update_store(path, histograms):
+    """Add the histograms to the store and return everything in it. The store is
+    locked while it is updated since worker pool workers share it.
+    """
+    with open(path, 'a+') as store_file:
+        if fcntl:
+            fcntl.flock(store_file, fcntl.LOCK_EX)
+        store_file.seek(0)
+        try:
+            stored = json.loads(store_file.read() or '{}')
+        except ValueError:
+            stored = {}
+        instrumentation.merge_histograms(stored, histograms)
+        store_file.seek(0)
+        store_file.truncate()
+        json.dump(stored, store_file, indent=2, sort_keys=True)
+    return stored
+
+
+def percentile(histogram, fraction):
+    """Return the upper bound of the bucket that the given fraction of the waits fall
+    in, or None if that is the last (unbounded) bucket.
+    """
+    needed = fraction * histogram['count']
+    seen = 0
+    for bound, count in zip(instrumentation.WAIT_BUCKETS, histogram['buckets']):
+        seen += count
+        if seen >= needed:
+            return bound
+    return None
+
+
+def slowest(histograms, size=REPORT_SIZE):
+    """Return the (label, phase, histogram) with the highest mean wait."""
+    waits = [
+        (label, phase, histogram)
+        for label, phases in histograms.items()
+        for phase, histogram in phases.items()
+        if histogram['count']
+    ]
+    waits.sort(key=lambda wait: -wait[2]['seconds'] / wait[2]['count'])
+    return waits[:size]
+
+
+def near_timeout(histograms, size=REPORT_SIZE):
+    """Return the (label, phase, histogram, rate) whose waits most often come near
+    (or reach) the timeout, if at least NEAR_TIMEOUT_RATE of the time.
+    """
+    waits = []
+    for label, phases in histograms.items():
+        for phase, histogram in phases.items():
+            if not histogram['count']:
+                continue
+            close_calls = histogram['near_timeout'] + histogram['failed']
+            rate = close_calls / histogram['count']
+            if rate >= NEAR_TIMEOUT_RATE:
+                waits.append((label, phase, histogram, rate))
+    waits.sort(key=lambda wait: -wait[3])
+    return waits[:size]
+
+
+class LocatorWaitsReporter:
+    def __init__(self, recorder, path):
+        self.recorder = recorder
+        self.path = path
+
+    def pytest_sessionfinish(self, session):
+        if session.config.option.collectonly or not self.recorder.histograms:
+            return
+        stored = update_store(self.path, self.recorder.histograms)
+        reporter = session.config.pluginmanager.get_plugin('terminalreporter')
+        if reporter:
+            self.report(reporter, stored)
+
+    def report(self, reporter, histograms):
+        reporter.write_sep('=', 'slowest locator waits (all recorded runs)')
+        if self.recorder.loading_calls:
+            reporter.write_line(
+                'here_then_gone: {} of {} loading indicators were never seen, saving '
+                '{:.1f}s of waiting for them this run'.format(
+                    self.recorder.loading_unseen,
+                    self.recorder.loading_calls,
+                    self.recorder.loading_saved_seconds,
+                )
+            )
+        if self.recorder.cache_stats:
+            hits = sum(stats[0] for stats in self.recorder.cache_stats.values())
+            misses = sum(stats[1] for stats in self.recorder.cache_stats.values())
+            reporter.write_line(
+                'element cache: {} hits and {} misses ({:.0%} hit rate) over {} '
+                'locators this run'.format(
+                    hits,
+                    misses,
+                    hits / (hits + misses),
+                    len(self.recorder.cache_stats),
+                )
+            )
+        for label, phase, histogram in slowest(histograms):
+            p90 = percentile(histogram, 0.9)
+            reporter.write_line(
+                '{:.2f}s mean, {:.2f}s max, 90% under {} over {} waits: {} ({})'.format(
+                    histogram['seconds'] / histogram['count'],
+                    histogram['max_seconds'],
+                    '{}s'.format(p90) if p90 is not None else 'n/a',
+                    histogram['count'],
+                    label,
+                    phase,
+                )
+            )
+        waits = near_timeout(histograms)
+        if waits:
+            reporter.write_sep('=', 'locator waits near their timeout')
+            for label, phase, histogram, rate in waits:
+                reporter.write_line(
+                    '{:.0%} of {} waits near the {}s timeout ({} failed): {} '
+                    '({})'.format(
+                        rate,
+                        histogram['count'],
+                        histogram['timeout'],
+                        histogram['failed'],
+                        label,
+                        phase,
+                    )
+                )
+
+
+def pytest_configure(config):
+    if not config.getoption('store_locator_waits'):
+        return
+    recorder = instrumentation.WaitRecorder()
+    instrumentation.install_wait_recorder(recorder)
+    config.pluginmanager.register(
+        LocatorWaitsReporter(
+            recorder, os.path.abspath(config.getoption('locator_waits_path'))
+        ),
+        'locator_waits_reporter',
+    )
+
+
+def pytest_unconfigure(config):
+    if config.getoption('store_locator_waits'):
+        instrumentation.install_wait_recorder(None)
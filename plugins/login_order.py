@@ -0,0 +1,101 @@
+"""Order the selected tests so that the browser changes who it is logged in as as few
+times as possible.
+
+Tests are moved as whole units (a test class, or a module for tests outside of
+classes, see `worker_pool.unit_key`) so that class scoped fixtures are still set up
+and torn down once per class, and tests keep their order within a unit. Units are
+grouped by the user that their login fixtures log in as, starting with the units
+that don't log in (as the browser starts out logged out), followed by each user in
+the order that they first appear. Only runs with `--order-by-login`.
+"""
+
+import pytest
+
+import settings
+from plugins.worker_pool import group_units
+
+
+ANONYMOUS = 'anonymous'
+
+# Login fixtures and the user that each of them logs in as
+LOGIN_FIXTURES = {
+    'must_be_logged_in': settings.USER_ONE,
+    'log_in_if_not_already': settings.USER_ONE,
+    'must_be_logged_in_as_user_two': settings.USER_TWO,
+    'log_in_as_user_two_if_not_already': settings.USER_TWO,
+    'must_be_logged_in_as_registration_user': settings.REGISTRATIONS_USER,
+    'login_as_user_with_registrations': settings.REGISTRATIONS_USER,
+}
+
+
+def required_identity(fixturenames):
+    """Return the user that the login fixtures among `fixturenames` log in as, or None
+    if they use none (or several different users).
+    """
+    users = {LOGIN_FIXTURES[name] for name in fixturenames if name in LOGIN_FIXTURES}
+    return users.pop() if len(users) == 1 else None
+
+
+def unit_identity(key, items):
+    """Return who the tests of a unit need to be logged in as: a user, ANONYMOUS if
+    none of them log in, or the unit key itself if they log in as different users
+    (so that it never matches a neighbour).
+    """
+    fixturenames = set()
+    for item in items:
+        fixturenames.update(getattr(item, 'fixturenames', ()))
+    if not fixturenames.intersection(LOGIN_FIXTURES):
+        return ANONYMOUS
+    return required_identity(fixturenames) or key
+
+
+def count_transitions(identities):
+    """Count the number of times that the identity changes, starting logged out."""
+    transitions = 0
+    current = ANONYMOUS
+    for identity in identities:
+        if identity != current:
+            transitions += 1
+            current = identity
+    return transitions
+
+
+def order_units(units):
+    """Return the unit keys of an ordered dict of unit key -> identity, grouped by
+    identity.
+    """
+    groups = {ANONYMOUS: []}
+    for key, identity in units.items():
+        groups.setdefault(identity, []).append(key)
+    return [key for keys in groups.values() for key in keys]
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('login order')
+    group.addoption(
+        '--order-by-login',
+        action='store_true',
+        default=False,
+        help='Group the tests by the user that they log in as.',
+    )
+
+
+# Run after any other plugin has selected the tests (i.e. sharding) so that only the
+# tests that will actually run are ordered.
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):
+    if not config.getoption('order_by_login'):
+        return
+    units = group_units(items)
+    identities = {key: unit_identity(key, unit) for key, unit in units.items()}
+    ordered = order_units(identities)
+    items[:] = [item for key in ordered for item in units[key]]
+
+    reporter = config.pluginmanager.get_plugin('terminalreporter')
+    if reporter:
+        before = count_transitions(identities.values())
+        after = count_transitions(identities[key] for key in ordered)
+        reporter.write_line(
+            'Ordered {} units by login: {} login transitions instead of {} in file '
+            'order ({} saved)'.format(len(units), after, before, before - after)
+        )
@@ -0,0 +1,204 @@
+"""Split the selected tests into shards of roughly equal run time.
+
+Durations of previous runs are kept in a local timings store (a json file of
+nodeid -> seconds). When `--shards` is given the collected tests are bin-packed into
+that many shards using those durations, and only the tests of `--shard` are run.
+
+The store is only updated when `--store-durations` is passed so that every shard of
+a run is computed from the same timings. Runs that retry failures (`--last-failed`)
+are not sharded again, since the timings may have changed since the shard was
+computed. They run the tests of the shard that was last run with the same shard
+options and selection instead, which is kept in pytest's cache.
+"""
+
+import hashlib
+import heapq
+import json
+import os
+from collections import defaultdict
+
+import pytest
+
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+DEFAULT_DURATIONS_PATH = '.test_durations.json'
+# Duration used for every test when the store has no timings at all
+DEFAULT_DURATION = 1.0
+# pytest cache key prefix of the nodeids of the shard that was last run
+SHARD_CACHE_KEY = 'sharding/shard'
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('sharding')
+    group.addoption(
+        '--shards',
+        type=int,
+        default=None,
+        help='Split the selected tests into this many shards.',
+    )
+    group.addoption(
+        '--shard',
+        type=int,
+        default=1,
+        help='Which shard to run (1-based). Only used with --shards.',
+    )
+    group.addoption(
+        '--durations-path',
+        default=DEFAULT_DURATIONS_PATH,
+        help='Path of the timings store. Default: {}'.format(DEFAULT_DURATIONS_PATH),
+    )
+    group.addoption(
+        '--store-durations',
+        action='store_true',
+        default=False,
+        help='Record the durations of this run in the timings store.',
+    )
+
+
+def load_durations(path):
+    try:
+        with open(path) as durations_file:
+            return json.load(durations_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_durations(path, durations):
+    """Add the durations to the store. The store is locked while it is updated since
+    worker pool workers share it.
+    """
+    with open(path, 'a+') as durations_file:
+        if fcntl:
+            fcntl.flock(durations_file, fcntl.LOCK_EX)
+        durations_file.seek(0)
+        try:
+            stored = json.loads(durations_file.read() or '{}')
+        except ValueError:
+            stored = {}
+        stored.update(durations)
+        durations_file.seek(0)
+        durations_file.truncate()
+        json.dump(stored, durations_file, indent=2, sort_keys=True)
+
+
+def split_into_shards(nodeids, durations, shards):
+    """Bin-pack nodeids into `shards` lists with the longest-processing-time-first
+    heuristic. Tests without a recorded duration are given the average duration.
+    Each shard keeps the original (collection) order of its tests.
+    """
+    known = [durations[nodeid] for nodeid in nodeids if nodeid in durations]
+    default = sum(known) / len(known) if known else DEFAULT_DURATION
+
+    weighted = sorted(
+        enumerate(nodeids),
+        key=lambda pair: (-durations.get(pair[1], default), pair[0]),
+    )
+    # Heap of (total duration, shard index), so ties go to the lowest shard
+    heap = [(0.0, index) for index in range(shards)]
+    assigned = [[] for _ in range(shards)]
+    totals = [0.0] * shards
+    for position, nodeid in weighted:
+        total, index = heapq.heappop(heap)
+        duration = durations.get(nodeid, default)
+        assigned[index].append((position, nodeid))
+        totals[index] = total + duration
+        heapq.heappush(heap, (totals[index], index))
+
+    return [[nodeid for _, nodeid in sorted(shard)] for shard in assigned], totals
+
+
+class DurationRecorder:
+    """Sum the setup, call and teardown durations of every test that was run."""
+
+    def __init__(self, path):
+        self.path = path
+        self.durations = defaultdict(float)
+
+    def pytest_runtest_logreport(self, report):
+        self.durations[report.nodeid] += getattr(report, 'duration', 0.0)
+
+    def pytest_sessionfinish(self, session):
+        if not self.durations:
+            return
+        update_durations(self.path, self.durations)
+
+
+def pytest_configure(config):
+    shards = config.getoption('shards')
+    if shards is not None and not 1 <= config.getoption('shard') <= shards:
+        raise pytest.UsageError('--shard must be between 1 and --shards')
+    if config.getoption('store_durations'):
+        config.pluginmanager.register(
+            DurationRecorder(os.path.abspath(config.getoption('durations_path'))),
+            'duration_recorder',
+        )
+
+
+def deselect(config, items, selected):
+    """Keep only the items whose nodeids are in `selected`."""
+    deselected = [item for item in items if item.nodeid not in selected]
+    items[:] = [item for item in items if item.nodeid in selected]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+
+
+def shard_cache_key(config):
+    """The cache key of the shard for this run's shard options and selection, so
+    that runs of other shards or selections don't read each other's shard.
+    """
+    selection = json.dumps(
+        [
+            config.getoption('markexpr'),
+            config.getoption('keyword'),
+            config.getoption('deselect') or [],
+            config.args,
+        ]
+    )
+    return '{}/{}-of-{}-{}'.format(
+        SHARD_CACHE_KEY,
+        config.getoption('shard'),
+        config.getoption('shards'),
+        hashlib.md5(selection.encode('utf-8')).hexdigest()[:12],
+    )
+
+
+# Run after the mark plugin applies -m/-k/--deselect so that shards are balanced
+# over the tests that will actually run.
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(session, config, items):
+    shards = config.getoption('shards')
+    if not shards:
+        return
+    # The cache is unavailable with -p no:cacheprovider
+    cache = getattr(config, 'cache', None)
+    key = shard_cache_key(config)
+    shard = cache.get(key, None) if cache else None
+    if config.getoption('lf', False) and shard is not None:
+        deselect(config, items, set(shard))
+        return
+    durations = load_durations(config.getoption('durations_path'))
+    split, totals = split_into_shards(
+        [item.nodeid for item in items], durations, shards
+    )
+    index = config.getoption('shard') - 1
+    if cache:
+        cache.set(key, split[index])
+    deselect(config, items, set(split[index]))
+
+    reporter = config.pluginmanager.get_plugin('terminalreporter')
+    if reporter:
+        reporter.write_line(
+            'Running shard {} of {}: {} tests, estimated {:.0f}s '
+            '(shard estimates: {})'.format(
+                index + 1,
+                shards,
+                len(items),
+                totals[index],
+                ', '.join('{:.0f}s'.format(total) for total in totals),
+            )
+        )
@@ -0,0 +1,79 @@
+"""Report where the time spent on WebDriver commands goes.
+
+With `--webdriver-report PATH`, every command that the tests' browsers execute is
+timed (see `base/instrumentation.py`) and a json report is written to PATH at the end
+of the session with the number and duration of the commands in total, by command, by
+test and by locator (`PageClass.attribute_name`), slowest first.
+
+The recorder is kept for the life of the process, so the report of a run that
+retries its failures in the same process (see `tasks/__init__.py`) covers every
+attempt. Worker pool workers each write their own report, with the worker id added
+to the file name.
+"""
+
+import json
+import os
+
+import pytest
+
+from base import instrumentation
+from plugins.worker_pool import WORKER_ID_ENV
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('webdriver profile')
+    group.addoption(
+        '--webdriver-report',
+        default=None,
+        help='Time every WebDriver command and write a json report to this path.',
+    )
+
+
+def report_path(path):
+    worker_id = os.environ.get(WORKER_ID_ENV)
+    if not worker_id:
+        return path
+    root, ext = os.path.splitext(path)
+    return '{}.{}{}'.format(root, worker_id, ext)
+
+
+class WebDriverProfiler:
+    def __init__(self, recorder, path):
+        self.recorder = recorder
+        self.path = path
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        self.recorder.start_test(item.nodeid)
+        yield
+        self.recorder.start_test(None)
+
+    def pytest_sessionfinish(self, session):
+        if session.config.option.collectonly:
+            return
+        report = self.recorder.report()
+        with open(self.path, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+
+        reporter = session.config.pluginmanager.get_plugin('terminalreporter')
+        if reporter:
+            total = report['total']
+            reporter.write_line(
+                'WebDriver commands: {} taking {:.1f}s, report written to {}'.format(
+                    total['count'], total['seconds'], self.path
+                )
+            )
+
+
+def pytest_configure(config):
+    path = config.getoption('webdriver_report')
+    if not path:
+        return
+    recorder = instrumentation.get_recorder()
+    if recorder is None:
+        recorder = instrumentation.CommandRecorder()
+        instrumentation.install(recorder)
+    config.pluginmanager.register(
+        WebDriverProfiler(recorder, os.path.abspath(report_path(path))),
+        'webdriver_profiler',
+    )
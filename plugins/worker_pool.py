@@ -0,0 +1,287 @@
+"""Run the selenium tests across several browser workers at once.
+
+The orchestrator (`run_worker_pool`, called from the invoke tasks) collects the
+selected tests, groups them into units and puts those units on a shared queue. It
+then starts one pytest process per worker with this module loaded as a plugin. Each
+worker has its own browser pool (and so its own browsers and login state) and pulls
+units off the queue until it is empty. Results are written per worker and merged
+back into a single report by the orchestrator.
+
+A unit is a test class, or a module for tests outside of classes, so that the class
+scoped login fixtures in `tests/conftest.py` are always set up and torn down within
+one worker.
+
+Units with a test that uses one of the `SERIAL_FIXTURES` (e.g.
+`delete_user_projects_at_setup`, which deletes every project of the shared user) would
+break the tests running on the other workers, so they are run one at a time on a
+single worker once the rest of the pool has finished.
+"""
+
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+
+import pytest
+
+
+WORKER_ID_ENV = 'WORKER_POOL_ID'
+ADDRESS_ENV = 'WORKER_POOL_ADDRESS'
+AUTHKEY_ENV = 'WORKER_POOL_AUTHKEY'
+RESULTS_ENV = 'WORKER_POOL_RESULTS'
+
+REPORT_PATH = 'worker_pool_report.json'
+# Fixtures that interfere with tests running at the same time on other workers
+SERIAL_FIXTURES = ('delete_user_projects_at_setup',)
+
+
+class _QueueManager(BaseManager):
+    pass
+
+
+def unit_key(nodeid):
+    """Return the key of the unit of work that a test belongs to: the test class if
+    it has one, otherwise the test module.
+    """
+    parts = nodeid.split('::')
+    if len(parts) > 2 and parts[2] != '()':
+        return '::'.join(parts[:2])
+    return parts[0]
+
+
+def group_units(items, key=lambda item: item.nodeid):
+    """Group items into an ordered dictionary of unit key -> items, keeping the
+    collection order both of the units and of the items within each unit.
+    """
+    units = OrderedDict()
+    for item in items:
+        units.setdefault(unit_key(key(item)), []).append(item)
+    return units
+
+
+class _Collector:
+    """Plugin used by the orchestrator to find out which tests were selected, and
+    which of them have to run serially.
+    """
+
+    def __init__(self):
+        self.nodeids = []
+        self.serial = set()
+
+    def pytest_collection_finish(self, session):
+        self.nodeids = [item.nodeid for item in session.items]
+        self.serial = {
+            item.nodeid
+            for item in session.items
+            if any(name in SERIAL_FIXTURES for name in item.fixturenames)
+        }
+
+
+class WorkerPlugin:
+    """Replace pytest's run loop in a worker so that it runs only the units that it
+    pulls off the shared queue.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.worker_id = os.environ[WORKER_ID_ENV]
+        self.results = OrderedDict()
+        host, port = os.environ[ADDRESS_ENV].rsplit(':', 1)
+        _QueueManager.register('get_queue')
+        manager = _QueueManager(
+            address=(host, int(port)),
+            authkey=bytes.fromhex(os.environ[AUTHKEY_ENV]),
+        )
+        manager.connect()
+        self.queue = manager.get_queue()
+
+    def _next_unit(self, units):
+        while True:
+            try:
+                key = self.queue.get_nowait()
+            except queue.Empty:
+                return None
+            if key in units:
+                return units[key]
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtestloop(self, session):
+        if (
+            session.testsfailed
+            and not session.config.option.continue_on_collection_errors
+        ):
+            raise session.Interrupted(
+                '{} errors during collection'.format(session.testsfailed)
+            )
+        if session.config.option.collectonly:
+            return True
+
+        units = group_units(session.items)
+        current = self._next_unit(units)
+        while current:
+            # Look one unit ahead so that fixtures shared between units (i.e. the
+            # session scoped project pools) are only torn down after the last unit.
+            upcoming = self._next_unit(units)
+            for index, item in enumerate(current):
+                if index + 1 < len(current):
+                    nextitem = current[index + 1]
+                else:
+                    nextitem = upcoming[0] if upcoming else None
+                item.config.hook.pytest_runtest_protocol(item=item, nextitem=nextitem)
+                if session.shouldstop:
+                    raise session.Interrupted(session.shouldstop)
+            current = upcoming
+        return True
+
+    def pytest_runtest_logreport(self, report):
+        # A test fails if any of its phases fail, otherwise use the call outcome
+        if report.failed:
+            self.results[report.nodeid] = 'failed'
+        elif report.when == 'call' or report.skipped:
+            self.results.setdefault(report.nodeid, report.outcome)
+
+    def pytest_sessionfinish(self, session):
+        with open(os.environ[RESULTS_ENV], 'w') as results_file:
+            json.dump({'worker': self.worker_id, 'results': self.results}, results_file)
+
+
+def pytest_configure(config):
+    if os.environ.get(WORKER_ID_ENV):
+        config.pluginmanager.register(WorkerPlugin(config), 'worker_pool_worker')
+
+
+def collect_nodeids(args):
+    """Collect the tests selected by the given pytest arguments without running them.
+    Returns a tuple of (nodeids, set of the nodeids that have to run serially).
+    """
+    collector = _Collector()
+    pytest.main(['--collect-only', '-qq'] + list(args), plugins=[collector])
+    return collector.nodeids, collector.serial
+
+
+def _serve_queue(units):
+    """Start a queue server in a background thread and fill it with the unit keys.
+    Returns the address and authkey for workers to connect with.
+    """
+    work_queue = queue.Queue()
+    for key in units:
+        work_queue.put(key)
+    authkey = os.urandom(16)
+    _QueueManager.register('get_queue', callable=lambda: work_queue)
+    server = _QueueManager(address=('127.0.0.1', 0), authkey=authkey).get_server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return '{}:{}'.format(*server.address), authkey.hex()
+
+
+def _run_workers(args, units, workers, report_path, first_id=0):
+    """Run the units on `workers` workers pulling from a shared queue. Returns a tuple
+    of (worker exit codes, ordered dict of nodeid -> result).
+    """
+    address, authkey = _serve_queue(units)
+    processes = []
+    worker_ids = ['gw{}'.format(first_id + index) for index in range(workers)]
+    for worker_id in worker_ids:
+        env = dict(os.environ)
+        env.update(
+            {
+                WORKER_ID_ENV: worker_id,
+                ADDRESS_ENV: address,
+                AUTHKEY_ENV: authkey,
+                RESULTS_ENV: '{}.{}'.format(report_path, worker_id),
+            }
+        )
+        cmd = [sys.executable, '-m', 'pytest', '-p', 'plugins.worker_pool'] + list(args)
+        print('>>> Starting worker {}'.format(worker_id))
+        processes.append(subprocess.Popen(cmd, env=env))
+
+    retcodes = [process.wait() for process in processes]
+
+    results = OrderedDict()
+    for worker_id in worker_ids:
+        worker_path = '{}.{}'.format(report_path, worker_id)
+        try:
+            with open(worker_path) as results_file:
+                worker_results = json.load(results_file)
+        except (OSError, ValueError):
+            # The worker crashed before it could write its results
+            continue
+        os.remove(worker_path)
+        for nodeid, outcome in worker_results['results'].items():
+            results[nodeid] = {'outcome': outcome, 'worker': worker_results['worker']}
+    return retcodes, results
+
+
+def run_worker_pool(args, workers, report_path=REPORT_PATH):
+    """Run the tests selected by `args` on `workers` browser workers, followed by the
+    units that have to run serially on a single worker.
+
+    Writes a merged report of test outcomes to `report_path` and returns a tuple of
+    (pytest exit code, list of failed nodeids).
+    """
+    nodeids, serial_nodeids = collect_nodeids(args)
+    units = group_units(nodeids, key=lambda nodeid: nodeid)
+    if not units:
+        print('>>> Worker pool: no tests selected')
+        return 5, []
+    serial_units = OrderedDict(
+        (key, unit_nodeids)
+        for key, unit_nodeids in units.items()
+        if serial_nodeids.intersection(unit_nodeids)
+    )
+    parallel_units = OrderedDict(
+        (key, unit_nodeids)
+        for key, unit_nodeids in units.items()
+        if key not in serial_units
+    )
+    print(
+        '>>> Worker pool: {} tests in {} units ({} run serially)'.format(
+            len(nodeids), len(units), len(serial_units)
+        )
+    )
+
+    retcodes = []
+    results = OrderedDict()
+    workers = min(workers, len(parallel_units))
+    if parallel_units:
+        phase_retcodes, phase_results = _run_workers(
+            args, parallel_units, workers, report_path
+        )
+        retcodes.extend(phase_retcodes)
+        results.update(phase_results)
+    if serial_units:
+        print('>>> Worker pool: running {} units serially'.format(len(serial_units)))
+        phase_retcodes, phase_results = _run_workers(
+            args, serial_units, 1, report_path, first_id=workers
+        )
+        retcodes.extend(phase_retcodes)
+        results.update(phase_results)
+
+    # Anything that never reported back (e.g. a worker crashed) counts as failed
+    for nodeid in nodeids:
+        results.setdefault(nodeid, {'outcome': 'failed', 'worker': None})
+
+    with open(report_path, 'w') as report_file:
+        json.dump(results, report_file, indent=2)
+
+    failed = [
+        nodeid for nodeid, result in results.items() if result['outcome'] == 'failed'
+    ]
+    outcomes = [result['outcome'] for result in results.values()]
+    print(
+        '>>> Worker pool: {} passed, {} failed, {} skipped (report: {})'.format(
+            outcomes.count('passed'),
+            len(failed),
+            outcomes.count('skipped'),
+            report_path,
+        )
+    )
+    if failed:
+        return 1, failed
+    if any(retcode not in (0, 5) for retcode in retcodes):
+        return max(retcodes), failed
+    return 0, failed
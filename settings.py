@@ -44,10 +44,19 @@ domains = {
 
 DRIVER = env('DRIVER', 'Firefox')
 HEADLESS = env.bool('HEADLESS', False)
+# Number of browsers each test process launches ahead of time
+DRIVER_POOL_SIZE = env.int('DRIVER_POOL_SIZE', 1)
+# Log in by injecting a session cookie (instead of with the login form) where possible
+FAST_LOGIN = env.bool('FAST_LOGIN', True)
 
 QUICK_TIMEOUT = env.int('QUICK_TIMEOUT', 4)
 TIMEOUT = env.int('TIMEOUT', 10)
 LONG_TIMEOUT = env.int('LONG_TIMEOUT', 30)
+# How long `here_then_gone` waits for a loading indicator to appear (it may never be
+# seen if loading is fast)
+LOADING_APPEAR_TIMEOUT = env.float('LOADING_APPEAR_TIMEOUT', 1)
+# Wait for the page to settle (see `BasePage.wait_until_settled`) after navigating
+WAIT_FOR_SETTLED = env.bool('WAIT_FOR_SETTLED', True)
 VERY_LONG_TIMEOUT = env.int('VERY_LONG_TIMEOUT', 60)
 
 DOMAIN = env('DOMAIN', 'stage1')
@@ -57,6 +66,10 @@ NEW_USER_EMAIL = env('NEW_USER_EMAIL')
 
 # Preferred node must be set to run tests on production
 PREFERRED_NODE = env('PREFERRED_NODE', None)
+# Number of test projects to create up front for the project fixtures to lease
+PROJECT_POOL_SIZE = env.int('PROJECT_POOL_SIZE', 2)
+# Number of threads that run api cleanup in the background (0 runs it in the test)
+TEARDOWN_WORKERS = env.int('TEARDOWN_WORKERS', 4)
 # Initialize Popular Pages environment variable to None which is what it should be for
 # all environments except Production which is set below.
 POPULAR_PAGES = None
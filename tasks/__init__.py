@@ -19,6 +19,14 @@ HERE = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
 BIN_PATH = os.path.dirname(sys.executable)
 bin_prefix = lambda cmd: os.path.join(BIN_PATH, cmd)
 MAX_RETRIES = int(os.getenv('MAX_RETRIES', 3))
+# Number of browser workers to run each partition on. 1 runs the tests serially.
+WORKERS = int(os.getenv('WORKERS', 1))
+# Record test durations in the local timings store used to balance shards.
+STORE_DURATIONS = os.getenv('STORE_DURATIONS', 'false').lower() == 'true'
+# Record locator wait times in the local store and report the slowest locators.
+STORE_LOCATOR_WAITS = os.getenv('STORE_LOCATOR_WAITS', 'false').lower() == 'true'
+# Time every WebDriver command and write a json report to this path.
+WEBDRIVER_REPORT = os.getenv('WEBDRIVER_REPORT')
 
 
 @task(aliases=['flake8'])
@@ -49,22 +57,39 @@ def requirements(ctx, dev=False):
     ctx.run(cmd, echo=True)
 
 
+@task
+def refresh_providers(ctx):
+    """Fetch the providers lists that the provider tests are parametrized with."""
+    from api.providers import refresh_providers_lists
+
+    lists = refresh_providers_lists()
+    print(
+        '>>> Fetched providers: {}'.format(
+            ', '.join(
+                '{} {}'.format(len(providers), type)
+                for type, providers in lists.items()
+            )
+        )
+    )
+
+
 @task
 def test_module_wo_exit(ctx, module=None, params=None):
     """Helper for running tests."""
     import pytest
 
-    if params is None:
-        params = []
+    args = _get_pytest_args(module, params)
+    print('>>> pytest args: {}'.format(args))
+    retcode = pytest.main(args)
+    return retcode
 
+
+def _get_pytest_args(module=None, params=None):
     args = ['-s', '-v', '--tb=short']
     for e in [module, params]:
         if e:
             args.extend([e] if isinstance(e, str) else e)
-
-    print('>>> pytest args: {}'.format(args))
-    retcode = pytest.main(args)
-    return retcode
+    return args
 
 
 @task
@@ -96,28 +121,30 @@ def test_two_minute_drill(ctx):
 @task
 def test_core_functionality_part_one(ctx):
     """Run first group of Core Functionality tests on the browser defined by TEST_BUILD."""
-    all_test_files = _get_test_file_list()
-    midpoint = len(all_test_files) // 2
-    file_list = all_test_files[:midpoint]
-    test_selenium_with_retries(
-        ctx,
-        'Core Functionality Part One',
-        file_list,
-        module=['-m', 'core_functionality'],
-    )
+    test_core_functionality_shard(ctx, shard=1, shards=2)
 
 
 @task
 def test_core_functionality_part_two(ctx):
     """Run second group of Core Functionality tests on the browser defined by TEST_BUILD."""
-    all_test_files = _get_test_file_list()
-    midpoint = len(all_test_files) // 2
-    file_list = all_test_files[midpoint:]
+    test_core_functionality_shard(ctx, shard=2, shards=2)
+
+
+@task
+def test_core_functionality_shard(ctx, shard, shards):
+    """Run one of `shards` duration balanced groups of Core Functionality tests on the
+    browser defined by TEST_BUILD.
+
+    Examples:
+        invoke test_core_functionality_shard --shard 1 --shards 3
+    """
     test_selenium_with_retries(
         ctx,
-        'Core Functionality Part Two',
-        file_list,
+        'Core Functionality Shard {} of {}'.format(shard, shards),
+        _get_test_file_list(),
         module=['-m', 'core_functionality'],
+        shard=shard,
+        shards=shards,
     )
 
 
@@ -217,19 +244,30 @@ def test_other_regression(ctx):
 @task
 def test_all_selenium_part_one(ctx):
     """Run first half of all of the tests on the browser defined by TEST_BUILD."""
-    all_test_files = _get_test_file_list()
-    midpoint = len(all_test_files) // 2
-    file_list = all_test_files[:midpoint]
-    test_selenium_with_retries(ctx, 'All Regression Part One', file_list)
+    test_all_selenium_shard(ctx, shard=1, shards=2)
 
 
 @task
 def test_all_selenium_part_two(ctx):
     """Run second half of all of the tests on the browser defined by TEST_BUILD."""
-    all_test_files = _get_test_file_list()
-    midpoint = len(all_test_files) // 2
-    file_list = all_test_files[midpoint:]
-    test_selenium_with_retries(ctx, 'All Regression Part Two', file_list)
+    test_all_selenium_shard(ctx, shard=2, shards=2)
+
+
+@task
+def test_all_selenium_shard(ctx, shard, shards):
+    """Run one of `shards` duration balanced groups of all of the tests on the browser
+    defined by TEST_BUILD.
+
+    Examples:
+        invoke test_all_selenium_shard --shard 1 --shards 3
+    """
+    test_selenium_with_retries(
+        ctx,
+        'All Regression Shard {} of {}'.format(shard, shards),
+        _get_test_file_list(),
+        shard=shard,
+        shards=shards,
+    )
 
 
 def _get_test_file_list():
@@ -239,8 +277,15 @@ def _get_test_file_list():
 
 
 @task
-def test_selenium_with_retries(ctx, partition_name, file_list, module=None):
-    """Run group of tests on the browser defined by TEST_BUILD."""
+def test_selenium_with_retries(
+    ctx, partition_name, file_list, module=None, workers=WORKERS, shard=1, shards=None
+):
+    """Run group of tests on the browser defined by TEST_BUILD.
+
+    If `shards` is set, only the tests of the given (1-based) `shard` are run. Shards
+    are balanced using the durations in the local timings store, see
+    `plugins/sharding.py`.
+    """
     flake(ctx)
 
     # If you want to run any of the invoke tasks locally then uncomment the line below
@@ -252,6 +297,13 @@ def test_selenium_with_retries(ctx, partition_name, file_list, module=None):
         )
     )
     print('>>> File list for {} is: {}'.format(partition_name, file_list))
+
+    refresh_providers(ctx)
+    file_list = _get_sharding_args(shard, shards) + file_list
+
+    if int(workers) > 1:
+        _test_selenium_with_worker_pool(partition_name, file_list, module, int(workers))
+
     retcode = test_module_wo_exit(ctx, params=file_list, module=module)
 
     if retcode != 1:
@@ -270,3 +322,41 @@ def test_selenium_with_retries(ctx, partition_name, file_list, module=None):
             break
 
     sys.exit(retcode)
+
+
+def _get_sharding_args(shard=1, shards=None):
+    args = ['-p', 'plugins.sharding', '-p', 'plugins.login_order', '--order-by-login']
+    if shards:
+        args.extend(['--shards', str(shards), '--shard', str(shard)])
+    if STORE_DURATIONS:
+        args.append('--store-durations')
+    if STORE_LOCATOR_WAITS:
+        args.extend(['-p', 'plugins.locator_waits', '--store-locator-waits'])
+    if WEBDRIVER_REPORT:
+        args.extend(['-p', 'plugins.webdriver_profile'])
+        args.extend(['--webdriver-report', WEBDRIVER_REPORT])
+    return args
+
+
+def _test_selenium_with_worker_pool(partition_name, file_list, module, workers):
+    """Run group of tests split across several browser workers, retrying only the
+    tests that failed.
+    """
+    from plugins.worker_pool import run_worker_pool
+
+    print('>>> Running {} on {} workers'.format(partition_name, workers))
+    retcode, failed = run_worker_pool(_get_pytest_args(module, file_list), workers)
+
+    for i in range(1, MAX_RETRIES + 1):
+        if retcode != 1:
+            break
+        print(
+            '>>> Retesting {} failures, iteration {}, in "/test/" '
+            'in {}'.format(partition_name, i, os.environ['TEST_BUILD'])
+        )
+        # Failed tests are selected directly, so they must not be sharded again
+        retcode, failed = run_worker_pool(
+            _get_pytest_args(module, _get_sharding_args() + failed), workers
+        )
+
+    sys.exit(retcode)
@@ -1,25 +1,173 @@
-import re
+import os
 
 import pytest
 from faker import Faker
-from pythosf import client
 
 import settings
 from api import osf_api
-from pages.login import (
-    logout,
-    safe_login,
+from api.project_pool import (
+    ProjectPool,
+    pooled_node_ids,
 )
+from api.providers import (
+    load_providers_list,
+    refresh_providers_lists,
+)
+from api.provisioning import Provisioner
+from api.teardown import (
+    TeardownError,
+    TeardownQueue,
+)
+from pages.login import safe_login
 from pages.project import ProjectPage
-from utils import launch_driver
+from plugins.login_order import required_identity
+from plugins.worker_pool import WORKER_ID_ENV
+from utils import (
+    DriverPool,
+    get_identity,
+    reset_driver,
+    session_cookie_name,
+    set_cookie_consent,
+)
+
+
+# Fixtures whose api data is created up front, mapped to the provisioning recipe that
+# creates it and whether every test needs its own object (rather than sharing one).
+# Every recipe must clean up what it creates when no test takes it (published
+# preprints can't be deleted, so they are still created by the tests that use them).
+PROVISIONED_FIXTURES = {
+    'default_project': ('project_pool', False),
+    'public_project': ('public_project_pool', False),
+    'default_project_with_metadata': ('metadata_project_pool', False),
+    'open_ended_schema_id': ('open_ended_schema_id', False),
+}
+
+
+def pytest_sessionstart(session):
+    """Start launching the browsers before collection so that they are ready by the
+    time the first test needs one.
+    """
+    if session.config.option.collectonly:
+        return
+    session.config.driver_pool = DriverPool(size=settings.DRIVER_POOL_SIZE)
+    session.config.teardown_queue = TeardownQueue(workers=settings.TEARDOWN_WORKERS)
+
+
+def pytest_collection_finish(session):
+    """Start creating the api data that the selected tests need in the background, so
+    that it is ready by the time each test needs it.
+    """
+    if session.config.option.collectonly or os.environ.get(WORKER_ID_ENV):
+        # Worker pool workers collect every test but only run some of them
+        return
+    if settings.PRODUCTION:
+        # Never create data on production for tests that are then skipped there
+        return
+    api_session = osf_api.get_default_session()
+    provisioner = Provisioner()
+    provisioner.register(
+        'project_pool',
+        lambda: ProjectPool(api_session, size=settings.PROJECT_POOL_SIZE),
+        ProjectPool.close,
+    )
+    provisioner.register(
+        'public_project_pool',
+        lambda: ProjectPool(api_session, public=True, size=1),
+        ProjectPool.close,
+    )
+    provisioner.register(
+        'metadata_project_pool',
+        lambda: ProjectPool(api_session, metadata=True, size=1),
+        ProjectPool.close,
+    )
+    provisioner.register(
+        'open_ended_schema_id', lambda: get_open_ended_schema_id(api_session)
+    )
+
+    counts = {}
+    for item in session.items:
+        if will_be_skipped(item):
+            continue
+        for name in getattr(item, 'fixturenames', ()):
+            if name not in PROVISIONED_FIXTURES:
+                continue
+            recipe, per_test = PROVISIONED_FIXTURES[name]
+            counts[recipe] = counts.get(recipe, 0) + 1 if per_test else 1
+    if settings.PREFERRED_NODE:
+        # The project fixtures use the preferred node instead of the project pools
+        for recipe in ('project_pool', 'public_project_pool', 'metadata_project_pool'):
+            counts.pop(recipe, None)
+    for recipe, count in counts.items():
+        provisioner.plan(recipe, count)
+    session.config.provisioner = provisioner
+
+
+def will_be_skipped(item):
+    """Return whether a test has a `skip` mark, or a `skipif` mark with a condition
+    that is true. String conditions aren't evaluated, so those tests may run.
+    """
+    if any(item.iter_markers(name='skip')):
+        return True
+    for mark in item.iter_markers(name='skipif'):
+        conditions = mark.args or (mark.kwargs.get('condition'),)
+        if any(
+            not isinstance(condition, str) and condition for condition in conditions
+        ):
+            return True
+    return False
+
+
+def take_provisioned(config, recipe):
+    """Return an object that was created up front by the given recipe, or None."""
+    provisioner = getattr(config, 'provisioner', None)
+    return provisioner.take(recipe) if provisioner else None
+
+
+def pytest_sessionfinish(session):
+    driver_pool = getattr(session.config, 'driver_pool', None)
+    if driver_pool:
+        driver_pool.close()
+    provisioner = getattr(session.config, 'provisioner', None)
+    if provisioner:
+        provisioner.close()
+    teardown_queue = getattr(session.config, 'teardown_queue', None)
+    if teardown_queue:
+        try:
+            teardown_queue.close()
+        except TeardownError as exc:
+            # The tests that deferred the work have already passed, so fail the run
+            reporter = session.config.pluginmanager.get_plugin('terminalreporter')
+            if reporter:
+                reporter.write_sep('=', 'deferred teardown errors', red=True)
+                reporter.write_line(str(exc))
+            session.exitstatus = 1
+
+
+def pytest_generate_tests(metafunc):
+    """Parametrize the `provider` argument of test classes that set a `provider_type`
+    with each provider of that type, from the lists fetched by `invoke
+    refresh_providers` (see api/providers.py). The lists are fetched here if they
+    haven't been fetched for this environment. Classes can also define a static
+    `provider_filter(provider)` method to only test some of the providers.
+    """
+    provider_type = getattr(metafunc.cls, 'provider_type', None)
+    if provider_type is None or 'provider' not in metafunc.fixturenames:
+        return
+    providers = load_providers_list(type=provider_type)
+    if providers is None:
+        # Not fetched yet for this environment (e.g. a plain pytest run)
+        providers = refresh_providers_lists()[provider_type]
+    provider_filter = getattr(metafunc.cls, 'provider_filter', None)
+    if provider_filter is not None:
+        providers = [provider for provider in providers if provider_filter(provider)]
+    metafunc.parametrize(
+        'provider', providers, ids=[provider['id'] for provider in providers]
+    )
 
 
 @pytest.fixture(scope='session')
 def session():
-    return client.Session(
-        api_base_url=settings.API_DOMAIN,
-        auth=(settings.USER_ONE, settings.USER_ONE_PASSWORD),
-    )
+    return osf_api.get_default_session()
 
 
 @pytest.fixture(scope='session', autouse=True)
@@ -31,11 +179,22 @@ def check_credentials(session):
         pytest.exit('Your user credentials are incorrect.')
 
 
-@pytest.fixture(scope='session')
-def driver():
-    driver = launch_driver()
+@pytest.fixture(scope='class')
+def driver(request):
+    """Lease a browser from the pool for each test class (or test outside of a class).
+    It is reset when it is returned, keeping its login so that the next class that
+    logs in as the same user doesn't have to log in again (see `default_logout`).
+    """
+    driver_pool = request.config.driver_pool
+    driver = driver_pool.acquire()
     yield driver
-    driver.quit()
+    driver_pool.release(driver, keep_login=True)
+
+
+@pytest.fixture(scope='session')
+def teardown_queue(request):
+    """Queue that runs api cleanup in the background, see api/teardown.py"""
+    return request.config.teardown_queue
 
 
 @pytest.fixture(scope='session')
@@ -48,29 +207,35 @@ def waffled_pages(session):
     settings.EMBER_PAGES = osf_api.waffled_pages(session)
 
 
-@pytest.fixture(scope='session', autouse=True)
+@pytest.fixture(scope='class', autouse=True)
 def hide_cookie_banner(driver):
     """Set the cookieconsent cookie so that the cookie banner doesn't show up
     (as it can obscure other UI elements).
      Note: If we ever want to test that banner will need to stop this cookie from being set.
     """
-    driver.get(settings.OSF_HOME)
-    driver.add_cookie({'name': 'osf_cookieconsent', 'value': '1', 'domain': '.osf.io'})
+    set_cookie_consent(driver)
 
 
-@pytest.fixture(scope='session')
+@pytest.fixture(scope='class')
 def hide_footer_slide_in(driver):
     """Set the browser local storage flag so that the Footer Slide In doesn't show up
     (i.e. overlay that displays at the bottom of the OSF page when you are not logged
     in. The slide in heading is: 'Start managing your projects on the OSF today.').
     This slide in can obscure other elements.
+     Note: This is class scoped since local storage is cleared between test classes.
     """
     driver.execute_script('window.localStorage.setItem("slide", 0);')
 
 
 @pytest.fixture(scope='class', autouse=True)
-def default_logout(driver):
-    logout(driver)
+def default_logout(request, driver):
+    """Start every class logged out, unless the class logs in as the same user that
+    the driver is already logged in as, in which case that login is kept.
+    """
+    required = required_identity(request.fixturenames)
+    reset_driver(
+        driver, keep_login=required is not None and get_identity(driver) == required
+    )
 
 
 @pytest.fixture(scope='class')
@@ -81,12 +246,11 @@ def must_be_logged_in(driver):
 @pytest.fixture
 def log_in_if_not_already(driver):
     """This fixture is similar to the must_be_logged_in fixture above. Where it differs
-    is that it first checks to see if the current user is already logged in before it
-    attempts to login again. Also the scope of this fixture is 'function' by default
-    instead of 'class' so it will be executed with every test function within a class.
+    is that the scope of this fixture is 'function' by default instead of 'class' so it
+    will be executed with every test function within a class. (safe_login only logs in
+    again if the driver isn't already logged in as the user.)
     """
-    if not user_logged_in(driver):
-        safe_login(driver)
+    safe_login(driver)
 
 
 @pytest.fixture
@@ -95,15 +259,7 @@ def user_logged_in(driver):
     existence of the OSF session cookie.  If the cookie exists then return True
     indicating that the user is logged in, otherwise return False.
     """
-    if settings.PRODUCTION:
-        cookie_name = 'osf'
-    else:
-        # In the testing environments the cookie name contains the environment (i.e.
-        # 'osf_test').  So parse out the environment from the OSF_HOME url.
-        match = re.search(r'(.*)\.osf\.io', settings.OSF_HOME[8:])
-        cookie_name = 'osf_' + match.group(1)
-
-    logged_in_cookie = driver.get_cookie(cookie_name)
+    logged_in_cookie = driver.get_cookie(session_cookie_name())
     if logged_in_cookie:
         return True
     else:
@@ -118,31 +274,108 @@ def must_be_logged_in_as_user_two(driver):
 @pytest.fixture
 def log_in_as_user_two_if_not_already(driver):
     """This fixture is similar to the must_be_logged_in_as_user_two fixture above.
-    Where it differs is that it first checks to see if the user is already logged in
-    before it attempts to login again. Also the scope of this fixture is 'function' by
-    default instead of 'class' so it will be executed with every test function within
-    a class.
+    Where it differs is that the scope of this fixture is 'function' by default instead
+    of 'class' so it will be executed with every test function within a class.
     """
-    if not user_logged_in(driver):
-        safe_login(driver, user=settings.USER_TWO, password=settings.USER_TWO_PASSWORD)
+    safe_login(driver, user=settings.USER_TWO, password=settings.USER_TWO_PASSWORD)
 
 
 @pytest.fixture(scope='class')
-def delete_user_projects_at_setup(session):
-    osf_api.delete_all_user_projects(session=session)
+def delete_user_projects_at_setup(session, teardown_queue):
+    # Let any deferred cleanup of the projects finish first
+    teardown_queue.wait()
+    # Keep the projects of the project pools, which other tests are leasing
+    osf_api.delete_all_user_projects(session=session, keep=pooled_node_ids())
+
+
+@pytest.fixture(scope='session')
+def project_pool(request, session, teardown_queue):
+    """Pool of private test projects, see api/project_pool.py"""
+    pool = take_provisioned(request.config, 'project_pool') or ProjectPool(
+        session, size=settings.PROJECT_POOL_SIZE
+    )
+    yield pool
+    # Wait for the leased projects to be returned to the pool
+    teardown_queue.wait()
+    pool.close()
+
+
+@pytest.fixture(scope='session')
+def public_project_pool(request, session, teardown_queue):
+    pool = take_provisioned(request.config, 'public_project_pool') or ProjectPool(
+        session, public=True
+    )
+    yield pool
+    teardown_queue.wait()
+    pool.close()
+
+
+@pytest.fixture(scope='session')
+def metadata_project_pool(request, session, teardown_queue):
+    pool = take_provisioned(request.config, 'metadata_project_pool') or ProjectPool(
+        session, metadata=True
+    )
+    yield pool
+    teardown_queue.wait()
+    pool.close()
+
+
+def get_open_ended_schema_id(session):
+    # Get the list of allowed registration schemas for OSF in a name and id pair list
+    # and pull out just the id for the Open-Ended Registration schema.
+    schema_list = osf_api.get_registration_schemas_for_provider(
+        session, provider_id='osf'
+    )
+    for schema in schema_list:
+        if schema[0] == 'Open-Ended Registration':
+            return schema[1]
+    return None
+
+
+@pytest.fixture(scope='session')
+def open_ended_schema_id(request, session):
+    """The id of the Open-Ended Registration schema, used to create draft registrations."""
+    schema_id = take_provisioned(request.config, 'open_ended_schema_id')
+    return schema_id or get_open_ended_schema_id(session)
+
+
+def create_published_preprint(session):
+    return osf_api.create_preprint(
+        session,
+        provider_id='osf',
+        title='OSF Selenium Preprint',
+        license_name='CC0 1.0 Universal',
+        subject_name='Engineering',
+    )
 
 
 @pytest.fixture
-def default_project(session):
-    """Creates a new project through the api and returns it. Deletes the project at the end of the test run.
+def published_preprint(session):
+    """Returns the guid of a new published preprint in OSF Preprints."""
+    return create_published_preprint(session)
+
+
+@pytest.fixture
+def default_project(request, session, teardown_queue):
+    """Leases a project from the project pool and returns it. The project is returned to the pool at the end of the test
+    (once the cleanup that the test deferred for it is done).
+    Tests marked `fresh_project` get a new project instead, which is deleted at the end
+    of the test.
     If PREFERRED_NODE is set, returns the APIDetail of preferred node.
     """
     if settings.PREFERRED_NODE:
-        yield osf_api.get_node(session)
-    else:
+        project = osf_api.get_node(session)
+        teardown_queue.wait(project.id)
+        yield project
+    elif request.node.get_closest_marker('fresh_project'):
         project = osf_api.create_project(session, title='OSF Test Project')
         yield project
-        project.delete()
+        teardown_queue.defer(project.delete, key=project.id)
+    else:
+        pool = request.getfixturevalue('project_pool')
+        project = pool.lease()
+        yield project
+        teardown_queue.defer(pool.release, project, key=project.id)
 
 
 @pytest.fixture
@@ -151,12 +384,13 @@ def default_project_page(driver, default_project):
 
 
 @pytest.fixture
-def public_project(session):
+def public_project(request, teardown_queue):
     if settings.PRODUCTION:
         raise ValueError('You should not create public projects on production!')
-    project = osf_api.create_project(session, title='OSF Test Project', public=True)
+    pool = request.getfixturevalue('public_project_pool')
+    project = pool.lease()
     yield project
-    project.delete()
+    teardown_queue.defer(pool.release, project, key=project.id)
 
 
 @pytest.fixture
@@ -172,19 +406,20 @@ def project_with_file(session, default_project):
 
 
 @pytest.fixture
-def default_project_with_metadata(session):
-    """Creates a new project through the api and returns it. Deletes the project at the end of the test run.
+def default_project_with_metadata(request, session, teardown_queue):
+    """Leases a project with custom metadata from the project pool and returns it. The project is returned to the pool at the end of the test.
     If PREFERRED_NODE is set, returns the APIDetail of preferred node.
     """
     if settings.PREFERRED_NODE:
         project = osf_api.get_node(session)
+        teardown_queue.wait(project.id)
         osf_api.update_custom_project_metadata(session, node_id=project.id)
         yield project
     else:
-        project = osf_api.create_project(session, title='OSF Test Project')
-        osf_api.update_custom_project_metadata(session, node_id=project.id)
+        pool = request.getfixturevalue('metadata_project_pool')
+        project = pool.lease()
         yield project
-        project.delete()
+        teardown_queue.defer(pool.release, project, key=project.id)
 
 
 @pytest.fixture(scope='class')
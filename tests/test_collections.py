@@ -2,11 +2,11 @@ import pytest
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 import markers
 import settings
 from api import osf_api
+from base.waits import WebDriverWait
 from pages.collections import (
     CollectionDiscoverPage,
     CollectionEditPage,
@@ -31,17 +31,15 @@ class TestCollectionDiscoverPages:
     an environment.
     """
 
-    def providers():
-        """Return collection providers to be used in Discover page test. The list of
+    provider_type = 'collections'
+
+    @staticmethod
+    def provider_filter(provider):
+        """Only test collection providers to be used in Discover page test. The list of
         collections in some environments (i.e. Staging2) has gotten very long, so a way
         to narrow the list is to set allow_submssions to False in the admin app and we
         can then skip those old testing collections."""
-        all_prov = osf_api.get_providers_list(type='collections')
-        return [prov for prov in all_prov if prov['attributes']['allow_submissions']]
-
-    @pytest.fixture(params=providers(), ids=[prov['id'] for prov in providers()])
-    def provider(self, request):
-        return request.param
+        return provider['attributes']['allow_submissions']
 
     def test_discover_page(self, session, driver, provider):
         discover_page = CollectionDiscoverPage(driver, provider=provider)
@@ -144,7 +142,7 @@ class TestCollectionSubmission:
 @markers.dont_run_on_prod
 class TestCollectionModeration:
     @pytest.fixture
-    def collection_project(self):
+    def collection_project(self, teardown_queue):
         """Returns a public project using the login session of User Two."""
         session_user_two = osf_api.get_user_two_session()
         project = osf_api.create_project(
@@ -154,7 +152,7 @@ class TestCollectionModeration:
             public=True,
         )
         yield project
-        project.delete()
+        teardown_queue.defer(project.delete, key=project.id)
 
     def submit_to_moderated_collection(self, collection_provider, node_id):
         """Helper function that preps a project and then submits it to a moderated
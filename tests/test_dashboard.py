@@ -3,11 +3,11 @@ import re
 import pytest
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 import markers
 import settings
 from api import osf_api
+from base.waits import WebDriverWait
 from pages.dashboard import DashboardPage
 from pages.institutions import InstitutionsLandingPage
 from pages.meetings import MeetingsPage
@@ -4,11 +4,11 @@ from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.select import Select
-from selenium.webdriver.support.wait import WebDriverWait
 
 import markers
 import settings
 from base.exceptions import PageException
+from base.waits import WebDriverWait
 from pages.landing import LandingPage
 from pages.login import (
     CASAuthorizationPage,
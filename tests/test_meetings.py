@@ -1,9 +1,9 @@
 import pytest
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.wait import WebDriverWait
 
 import markers
+from base.waits import WebDriverWait
 from pages.meetings import (
     MeetingDetailPage,
     MeetingsPage,
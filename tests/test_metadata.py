@@ -4,12 +4,12 @@ import pytest
 import requests
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 import markers
 import settings
 import utils
 from api import osf_api
+from base.waits import WebDriverWait
 from pages.project import (
     FilesMetadataPage,
     FilesPage,
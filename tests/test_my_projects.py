@@ -1,13 +1,14 @@
-import time
-
 import pytest
 from selenium.webdriver import ActionChains
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 import markers
 from api import osf_api
+from base.waits import (
+    WebDriverWait,
+    wait_until_stable,
+)
 from pages.project import (
     MyProjectsPage,
     ProjectPage,
@@ -100,9 +101,17 @@ class TestMyProjectsPage:
             action_chains.drag_and_drop(drag_project.element, drop_collection.element)
             action_chains.perform()
         else:
+            class_name_script = 'return arguments[0].className;'
+            unselected = driver.execute_script(class_name_script, drag_project.element)
             action_chains.click_and_hold(drag_project.element).perform()
-            # Chrome -> will highlight multiple rows if you do not sleep here
-            time.sleep(1)
+            # Chrome -> will highlight multiple rows if you move before the row has
+            # finished being selected
+            wait_until_stable(
+                driver,
+                class_name_script,
+                drag_project.element,
+                changed_from=unselected,
+            )
             action_chains.move_to_element(drop_collection.element).perform()
             action_chains.reset_actions()
             action_chains.click_and_hold(drag_project.element)
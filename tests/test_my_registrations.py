@@ -5,11 +5,11 @@ from faker import Faker
 from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 import api
 import markers
 from api import osf_api
+from base.waits import WebDriverWait
 from pages.registrations import MyRegistrationsPage
 from pages.registries import (
     DraftRegistrationMetadataPage,
@@ -1,10 +1,10 @@
 import pytest
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.wait import WebDriverWait
 
 import markers
 import settings
 from api import osf_api
+from base.waits import WebDriverWait
 from pages.collections import (
     CollectionDiscoverPage,
     CollectionSubmitPage,
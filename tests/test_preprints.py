@@ -8,12 +8,12 @@ from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 import markers
 import settings
 import utils
 from api import osf_api
+from base.waits import WebDriverWait
 from pages.login import logout
 from pages.preprints import (
     BrandedPreprintsDiscoverPage,
@@ -240,18 +240,11 @@ class TestPreprintWorkflow:
                     pass
 
     @pytest.fixture
-    def preprint_detail_page(self, driver, session):
-        """Fixture that uses the OSF api to create a published preprint in OSF
-        Preprints and then navigates to the Preprint Detail page for this preprint.
+    def preprint_detail_page(self, driver, published_preprint):
+        """Fixture that uses an api created published preprint in OSF Preprints and
+        navigates to the Preprint Detail page for this preprint.
         """
-        preprint_node = osf_api.create_preprint(
-            session,
-            provider_id='osf',
-            title='OSF Selenium Preprint',
-            license_name='CC0 1.0 Universal',
-            subject_name='Engineering',
-        )
-        preprint_detail_page = PreprintDetailPage(driver, guid=preprint_node)
+        preprint_detail_page = PreprintDetailPage(driver, guid=published_preprint)
         preprint_detail_page.goto()
         return preprint_detail_page
 
@@ -1225,30 +1218,14 @@ class TestPreprintMetrics:
             )
 
 
-@pytest.fixture(scope='session')
-def providers():
-    """Return all preprint providers."""
-    return osf_api.get_providers_list()
-
-
-@pytest.fixture(scope='session')
-def custom_providers():
-    """Return the API data of all preprint providers with custom domains."""
-    providers = osf_api.get_providers_list()
-    return [
-        provider
-        for provider in providers
-        if provider['attributes']['domain_redirect_enabled']
-    ]
-
-
 @markers.core_functionality
 class TestProvidersWithCustomDomains:
-    @pytest.fixture(
-        params=custom_providers(), ids=[prov['id'] for prov in custom_providers()]
-    )
-    def provider(self, request):
-        return request.param
+    provider_type = 'preprints'
+
+    @staticmethod
+    def provider_filter(provider):
+        """Only test preprint providers with custom domains."""
+        return provider['attributes']['domain_redirect_enabled']
 
     def test_landing_page_loads(self, driver, provider):
         PreprintLandingPage(driver, provider=provider).goto()
@@ -1276,9 +1253,7 @@ class TestProvidersWithCustomDomains:
 class TestBrandedProviders:
     """This class only runs in Production for all Branded Providers"""
 
-    @pytest.fixture(params=providers(), ids=[prov['id'] for prov in providers()])
-    def provider(self, request):
-        return request.param
+    provider_type = 'preprints'
 
     def test_detail_page(self, session, driver, provider):
         """Test a preprint detail page by grabbing the first search result from the discover page."""
@@ -4,11 +4,11 @@ from urllib.parse import urljoin
 import pytest
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 import markers
 import settings
 from api import osf_api
+from base.waits import WebDriverWait
 from pages.login import (
     LoginPage,
     login,
@@ -39,6 +39,7 @@ def project_page_with_file(driver, project_with_file):
 class TestProjectDetailPage:
     @markers.smoke_test
     @markers.core_functionality
+    @markers.fresh_project
     def test_change_title(self, session, driver, project_page, fake):
 
         new_title = fake.sentence(nb_words=4)
@@ -75,6 +76,7 @@ class TestProjectDetailPage:
     @markers.dont_run_on_prod
     @markers.dont_run_on_preferred_node
     @markers.core_functionality
+    @markers.fresh_project
     def test_make_public(self, session, driver, project_page):
         # Set project to public
         WebDriverWait(driver, 5).until(
@@ -164,6 +166,7 @@ class TestForksPage:
 
     @markers.dont_run_on_prod
     @markers.core_functionality
+    @markers.fresh_project
     def test_create_fork(self, driver, session, must_be_logged_in, forks_page):
         forks_page.placeholder_text.present()
         assert len(forks_page.listed_forks) == 0
@@ -199,6 +202,7 @@ class TestForksPage:
 @markers.dont_run_on_prod
 @pytest.mark.usefixtures('must_be_logged_in')
 class TestProjectComponents:
+    @markers.fresh_project
     def test_add_component(self, driver, session, project_page):
         """Test the functionality of adding a new child component node to a project"""
 
@@ -292,6 +296,7 @@ class TestProjectComponents:
             # But it cannot be deleted if the component is not deleted first.
             osf_api.delete_project(session, component_guid, None)
 
+    @markers.fresh_project
     def test_delete_component_from_project(self, driver, session, default_project):
         """Test the functionality of deleting a child component node from the parent
         project's Project Overview page.
@@ -463,6 +468,7 @@ class TestProjectComponents:
 @markers.dont_run_on_prod
 @pytest.mark.usefixtures('hide_footer_slide_in')
 class TestProjectVOLs:
+    @markers.fresh_project
     def test_vol_project_overview_page(self, driver, session, project_with_file):
         """Test that creates a View Only Link using the OSF api and then uses that VOL
         to navigate to the Project Overview page for the project.
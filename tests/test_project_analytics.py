@@ -7,11 +7,11 @@ import pytest
 from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 import markers
 import settings
 from api import osf_api
+from base.waits import WebDriverWait
 from pages.project import (
     AnalyticsPage,
     FilesPage,
@@ -6,11 +6,11 @@ import pytest
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 import markers
 import settings
 from api import osf_api
+from base.waits import WebDriverWait
 from pages.landing import LandingPage
 from pages.project import (
     FilesPage,
@@ -111,6 +111,7 @@ class TestFilesPage:
     """
 
     @pytest.mark.parametrize('provider', testable_addons + ['osfstorage'])
+    @markers.fresh_project
     def test_rename_file(self, driver, default_project, session, provider):
         """Test that renames a single file from one of the storage providers on the
         Project Files List page.
@@ -187,6 +188,7 @@ class TestFilesPage:
             osf_api.delete_addon_files(session, provider, current_browser, guid=node_id)
 
     @pytest.mark.parametrize('provider', testable_addons + ['osfstorage'])
+    @markers.fresh_project
     def test_delete_single_file(self, driver, default_project, session, provider):
         """Test that deletes a single file from one of the storage providers on the
         Project Files List page.
@@ -304,6 +306,7 @@ class TestFilesPage:
             osf_api.delete_addon_files(session, provider, current_browser, guid=node_id)
 
     @pytest.mark.parametrize('provider', testable_addons)
+    @markers.fresh_project
     def test_move_single_file(self, driver, default_project, session, provider):
         """Test that moves a single file from one of the storage providers on the
         Project Files List page to OSF Storage.
@@ -447,6 +450,7 @@ class TestFilesPage:
             osf_api.delete_addon_files(session, provider, current_browser, guid=node_id)
 
     @pytest.mark.parametrize('provider', testable_addons)
+    @markers.fresh_project
     def test_copy_single_file(self, driver, default_project, session, provider):
         """Test that copies a single file from one of the storage providers on the
         Project Files List page to OSF Storage.
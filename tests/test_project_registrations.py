@@ -21,25 +21,14 @@ def registrations_page(driver, default_project):
 
 
 @pytest.fixture()
-def registrations_page_with_draft(session, registrations_page):
+def registrations_page_with_draft(session, registrations_page, open_ended_schema_id):
     """This fixture uses the registrations_page fixture above and adds a draft
-    registration to the temporary project.  NOTE: Since we are creating the draft
-    registration from a temporary project that gets automatically deleted when we are
-    done with it, the draft registration as a child of the project will also get
-    deleted.
+    registration to the temporary project.  NOTE: The draft registration is deleted
+    when the project is reset for the next test that uses it.
     """
-
-    # First get the list of allowed registration schemas for OSF in a name and id pair
-    # list. Then loop through the list to pull out just the id for the Open-Ended
-    # Registration schema. We'll need this schema id to create the draft.
-    schema_list = osf_api.get_registration_schemas_for_provider(provider_id='osf')
-    for schema in schema_list:
-        if schema[0] == 'Open-Ended Registration':
-            schema_id = schema[1]
-            break
-    # Use the api to create a draft registration for the temporary project
+    # Use the api to create an Open-Ended draft registration for the temporary project
     osf_api.create_draft_registration(
-        session, node_id=registrations_page.guid, schema_id=schema_id
+        session, node_id=registrations_page.guid, schema_id=open_ended_schema_id
     )
     # Reload the page so that the draft is visible on the tab
     registrations_page.reload()
@@ -1,10 +1,10 @@
 import pytest
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 import markers
 from api import osf_api
+from base.waits import WebDriverWait
 from pages.registries import (
     RegistrationAnalyticsPage,
     RegistrationCommentsPage,
@@ -4,15 +4,14 @@ import re
 import tkinter
 
 import pytest
-from pythosf import client
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 import markers
 import settings
 from api import osf_api
+from base.waits import WebDriverWait
 from pages.login import safe_login
 from pages.registrations import MyRegistrationsPage
 from pages.registries import (
@@ -133,13 +132,7 @@ class TestRegistriesSearch:
 @markers.smoke_test
 @markers.core_functionality
 class TestBrandedRegistriesPages:
-    def providers():
-        """Return all registration providers."""
-        return osf_api.get_providers_list(type='registrations')
-
-    @pytest.fixture(params=providers(), ids=[prov['id'] for prov in providers()])
-    def provider(self, request):
-        return request.param
+    provider_type = 'registrations'
 
     def test_discover_page(self, session, driver, provider):
         """This test will load the Discover page for each Branded Registry Provider that
@@ -155,22 +148,16 @@ class TestBrandedRegistriesPages:
 @markers.dont_run_on_prod
 class TestDraftRegistration:
     @pytest.fixture
-    def draft_registration(self, session, driver, default_project):
+    def draft_registration(
+        self, session, driver, default_project, open_ended_schema_id
+    ):
         """Return a draft registration created from a temporary project. This fixture
-        uses the Open-Ended Registration schema in the OSF Registry. NOTE: Since the
-        temporary project is deleted at the end of the test, this draft registration
-        will also be automatically deleted.
+        uses the Open-Ended Registration schema in the OSF Registry. NOTE: The draft
+        registration is deleted when the project is reset for the next test that uses
+        it.
         """
-
-        # First get the schema id for an 'Open-Ended Registration'
-        schema_list = osf_api.get_registration_schemas_for_provider(provider_id='osf')
-        for schema in schema_list:
-            if schema[0] == 'Open-Ended Registration':
-                schema_id = schema[1]
-                break
-
         return osf_api.create_draft_registration(
-            session, node_id=default_project.id, schema_id=schema_id
+            session, node_id=default_project.id, schema_id=open_ended_schema_id
         )
 
     def test_subjects_sort_order(self, driver, draft_registration, must_be_logged_in):
@@ -228,13 +215,10 @@ def login_as_user_with_registrations(driver):
 class TestRegistrationSubmission:
     @pytest.fixture
     def registration_user_session(self):
-        return client.Session(
-            api_base_url=settings.API_DOMAIN,
-            auth=(settings.REGISTRATIONS_USER, settings.REGISTRATIONS_USER_PASSWORD),
-        )
+        return osf_api.get_registrations_user_session()
 
     @pytest.fixture
-    def project_with_file_reg(self, registration_user_session):
+    def project_with_file_reg(self, registration_user_session, teardown_queue):
         """Returns a project with a file using the login session of the Registrations
         User.
         """
@@ -247,7 +231,7 @@ class TestRegistrationSubmission:
             name='osf selenium test file for registration.txt',
         )
         yield project
-        project.delete()
+        teardown_queue.defer(project.delete, key=project.id)
 
     @pytest.fixture
     def add_new_page(self, driver, login_as_user_with_registrations):
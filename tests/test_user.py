@@ -6,12 +6,12 @@ import pytest
 import requests
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
 import components.email_access as EmailAccess
 import markers
 import settings
 from api import osf_api
+from base.waits import WebDriverWait
 from pages import user
 
 
@@ -127,70 +127,52 @@ class TestUserAccountSettings:
         assert user.AccountSettingsPage(driver, verify=True)
         settings_page.loading_indicator.here_then_gone()
 
-        # Enter an IMAP enabled email address in the email address input box and click
-        # the Add email button
-        settings_page.email_address_input.send_keys_deliberately(settings.IMAP_EMAIL)
-        settings_page.add_email_button.click()
-        try:
-            # After clicking the Close button on the confirmation modal, verify that the
-            # email address is displayed in the Unconfirmed emails list
-            settings_page.confirm_email_sent_modal.close_button.click()
-            unconfirmed_email = settings_page.get_unconfirmed_email_item(
+        # Start watching the inbox before the email can be sent, so that only emails
+        # that arrive from here on are matched
+        with EmailAccess.MailWaiter(
+            settings.IMAP_HOST,
+            settings.IMAP_EMAIL,
+            settings.IMAP_EMAIL_PASSWORD,
+        ) as mail_waiter:
+            # Enter an IMAP enabled email address in the email address input box and
+            # click the Add email button
+            settings_page.email_address_input.send_keys_deliberately(
                 settings.IMAP_EMAIL
             )
-            assert unconfirmed_email is not None
-
-            # Next connect to the email account and verify that a Confirm account merge
-            # email was actually sent
-            email_count = 0
-            loop_counter = 0
-            while email_count == 0:
-                # Retrieve count of UNSEEN email messages from inbox
-                email_count = EmailAccess.get_count_of_unseen_emails_by_imap(
-                    settings.IMAP_HOST,
-                    settings.IMAP_EMAIL,
-                    settings.IMAP_EMAIL_PASSWORD,
-                )
-                # To prevent an endless loop waiting for the email
-                loop_counter += 1
-                if loop_counter == 90:
-                    raise Exception(
-                        'No unseen emails. Verify that Reset Password email was sent.'
-                    )
-                    break
-
-            if email_count > 0:
-                # Next retrieve the email with subject 'Confirm account merge'
-                email_body = EmailAccess.get_latest_email_body_by_imap(
-                    settings.IMAP_HOST,
-                    settings.IMAP_EMAIL,
-                    settings.IMAP_EMAIL_PASSWORD,
-                    'Inbox',
-                    'SUBJECT',
-                    'Confirm account merge',
+            settings_page.add_email_button.click()
+            try:
+                # After clicking the Close button on the confirmation modal, verify that
+                # the email address is displayed in the Unconfirmed emails list
+                settings_page.confirm_email_sent_modal.close_button.click()
+                unconfirmed_email = settings_page.get_unconfirmed_email_item(
+                    settings.IMAP_EMAIL
                 )
+                assert unconfirmed_email is not None
+
+                # Next wait for the email with subject 'Confirm account merge' to arrive
+                message = mail_waiter.wait_for('SUBJECT', 'Confirm account merge')
 
                 # Search through the email body and verify that the OSF account owner's
                 # email address is in the body of the email
-                assert str(email_body).find(settings.USER_ONE) > 0
-        finally:
-            # Lastly delete the unconfirmed email from the account
-            unconfirmed_email = settings_page.get_unconfirmed_email_item(
-                settings.IMAP_EMAIL
-            )
-            if unconfirmed_email is not None:
-                delete_button = unconfirmed_email.find_element_by_css_selector(
-                    'button[data-test-delete-button]'
+                assert settings.USER_ONE in EmailAccess.get_message_body(message)
+            finally:
+                # Lastly delete the unconfirmed email from the account
+                unconfirmed_email = settings_page.get_unconfirmed_email_item(
+                    settings.IMAP_EMAIL
                 )
-                delete_button.click()
+                if unconfirmed_email is not None:
+                    delete_button = unconfirmed_email.find_element_by_css_selector(
+                        'button[data-test-delete-button]'
+                    )
+                    delete_button.click()
 
-                # Verify email address in text of confirmation modal
-                assert (
-                    settings_page.confirm_remove_email_modal.deleted_email.text
-                    == settings.IMAP_EMAIL
-                )
-                settings_page.confirm_remove_email_modal.delete_button.click()
-                settings_page.reload()
+                    # Verify email address in text of confirmation modal
+                    assert (
+                        settings_page.confirm_remove_email_modal.deleted_email.text
+                        == settings.IMAP_EMAIL
+                    )
+                    settings_page.confirm_remove_email_modal.delete_button.click()
+                    settings_page.reload()
                 unconfirmed_email = settings_page.get_unconfirmed_email_item(
                     settings.IMAP_EMAIL
                 )
@@ -369,7 +351,7 @@ class TestUserAccountSettings:
 @markers.dont_run_on_prod
 @pytest.mark.usefixtures('must_be_logged_in')
 class TestUserDeveloperApps:
-    def test_user_settings_create_dev_app(self, driver, session, fake):
+    def test_user_settings_create_dev_app(self, driver, session, fake, teardown_queue):
         """Create a Developer Application from the User Settings Developer Apps page
         in OSF. The test uses the OSF api to delete the developer app at the end of the
         test as cleanup.
@@ -476,7 +458,9 @@ class TestUserDeveloperApps:
             dev_apps_page.loading_indicator.here_then_gone()
         finally:
             # Lastly use the api to delete the dev app as cleanup
-            osf_api.delete_user_developer_app(session, app_id=client_id)
+            teardown_queue.defer(
+                osf_api.delete_user_developer_app, session, app_id=client_id
+            )
 
     def test_user_settings_delete_dev_app(self, driver, session, fake):
         """Delete a Developer Application from the User Settings Developer Apps page
@@ -593,7 +577,7 @@ class TestUserDeveloperApps:
             if dev_app_data:
                 osf_api.delete_user_developer_app(session, app_id=app_id)
 
-    def test_user_settings_edit_dev_app(self, driver, session, fake):
+    def test_user_settings_edit_dev_app(self, driver, session, fake, teardown_queue):
         """Edit a Developer Application from the User Settings Developer Apps page
         in OSF. The test uses the OSF api to first create the developer application that
         will then be edited using the Front End interface. After the test is complete
@@ -715,7 +699,9 @@ class TestUserDeveloperApps:
             assert dev_app_card
         finally:
             # Lastly use the api to delete the dev app as cleanup
-            osf_api.delete_user_developer_app(session, app_id=app_id)
+            teardown_queue.defer(
+                osf_api.delete_user_developer_app, session, app_id=app_id
+            )
 
 
 @markers.dont_run_on_prod
@@ -769,7 +755,9 @@ class TestUserPersonalAccessTokens:
             page.scroll_into_view(checkbox)
             assert checkbox.is_selected() == perm
 
-    def test_user_settings_create_PAT(self, driver, session, fake, all_scopes):
+    def test_user_settings_create_PAT(
+        self, driver, session, fake, all_scopes, teardown_queue
+    ):
         """Create a Personal Access Token from the User Settings Personal Access Tokens
         page in OSF. The test uses the OSF api to delete the personal access token at
         the end of the test as cleanup.
@@ -871,7 +859,9 @@ class TestUserPersonalAccessTokens:
         finally:
             # Delete the token using the api as cleanup
             if token_id:
-                osf_api.delete_personal_access_token(session, token_id=token_id)
+                teardown_queue.defer(
+                    osf_api.delete_personal_access_token, session, token_id=token_id
+                )
 
     def test_user_settings_delete_PAT_from_edit_page(
         self, driver, session, fake, default_project, all_scopes
@@ -1088,7 +1078,9 @@ class TestUserPersonalAccessTokens:
             if pat_data:
                 osf_api.delete_personal_access_token(session, token_id=public_token_id)
 
-    def test_user_settings_edit_PAT(self, driver, session, fake, all_scopes):
+    def test_user_settings_edit_PAT(
+        self, driver, session, fake, all_scopes, teardown_queue
+    ):
         """Edit a Personal Access Token from the User Settings Edit Personal Access
         Token page in OSF. The test uses the OSF api to first create the personal access
         token that will then be edited using the Front End interface. At the end of the
@@ -1163,4 +1155,8 @@ class TestUserPersonalAccessTokens:
         finally:
             # Delete the token using the api as cleanup
             if public_token_id:
-                osf_api.delete_personal_access_token(session, token_id=public_token_id)
+                teardown_queue.defer(
+                    osf_api.delete_personal_access_token,
+                    session,
+                    token_id=public_token_id,
+                )
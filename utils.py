@@ -1,9 +1,24 @@
 import datetime
 import os
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
 
 from selenium import webdriver
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    WebDriverException,
+)
 
 import settings
+from base import expected_conditions as ec
+from base import instrumentation
+
+
+# Seconds that async scripts (which have their own deadlines) may run for
+ASYNC_SCRIPT_TIMEOUT = settings.VERY_LONG_TIMEOUT + 5
 
 
 def launch_driver(driver_name=settings.DRIVER, desired_capabilities=None):
@@ -99,10 +114,215 @@ def launch_driver(driver_name=settings.DRIVER, desired_capabilities=None):
     else:
         driver = driver_cls()
 
+    instrumentation.instrument(driver)
     driver.maximize_window()
+    # Async scripts time themselves out, so let them run for as long as they need
+    driver.set_script_timeout(ASYNC_SCRIPT_TIMEOUT)
+    track_requests(driver)
     return driver
 
 
+def track_requests(driver):
+    """Install the request tracker of `BasePage.wait_until_settled` in every page
+    before the page's own scripts run, so that it sees the app's boot requests. Only
+    Chrome (through the DevTools protocol) allows this; in other browsers the tracker
+    is installed by the first settle wait on each page.
+    """
+    if not hasattr(driver, 'execute_cdp_cmd'):
+        return False
+    try:
+        driver.execute_cdp_cmd(
+            'Page.addScriptToEvaluateOnNewDocument',
+            {'source': ec.REQUEST_TRACKER_SCRIPT},
+        )
+    except WebDriverException:
+        return False
+    return True
+
+
+def session_cookie_name():
+    """Return the name of the OSF session cookie. In the testing environments the
+    cookie name contains the environment (i.e. 'osf_test').
+    """
+    if settings.PRODUCTION:
+        return 'osf'
+    match = re.search(r'(.*)\.osf\.io', settings.OSF_HOME[8:])
+    return 'osf_' + match.group(1)
+
+
+def set_cookie_consent(driver):
+    """Set the cookieconsent cookie so that the cookie banner doesn't show up
+    (as it can obscure other UI elements). The cookie is set for '.osf.io', so any OSF
+    page (including CAS) can set it.
+    """
+    host = urlparse(driver.current_url).hostname or ''
+    if host != 'osf.io' and not host.endswith('.osf.io'):
+        driver.get(settings.OSF_HOME)
+    driver.add_cookie({'name': 'osf_cookieconsent', 'value': '1', 'domain': '.osf.io'})
+
+
+def goto_osf_origin(driver):
+    """Make sure the browser is on an OSF page, loading the lightweight robots.txt if
+    it isn't, so that OSF cookies and local storage can be used without loading an
+    actual OSF page.
+    """
+    if not driver.current_url.startswith(settings.OSF_HOME):
+        driver.get(settings.OSF_HOME + '/robots.txt')
+
+
+def close_extra_windows(driver):
+    """Close every browser window or tab except for the first one and switch to it."""
+    main_window, *extra_windows = driver.window_handles
+    for window in extra_windows:
+        driver.switch_to.window(window)
+        driver.close()
+    driver.switch_to.window(main_window)
+
+
+# Identities a driver can be logged in as, besides the user (email) it is logged in as
+ANONYMOUS = 'anonymous'
+UNKNOWN = 'unknown'
+
+
+def set_identity(driver, identity, cookie=None, cas=None):
+    """Record who the driver is logged in as, along with the value of the OSF session
+    cookie of that login (None when logged out). `cas` records whether the browser
+    itself has logged in to CAS, i.e. has a single sign-on cookie; None keeps the
+    previous value.
+    """
+    previous = getattr(driver, 'osf_auth', {})
+    driver.osf_auth = {
+        'identity': identity,
+        'cookie': cookie,
+        'cas': previous.get('cas', True) if cas is None else cas,
+    }
+
+
+def get_identity(driver):
+    """Return who the driver is logged in as (a user, ANONYMOUS or UNKNOWN). The
+    recorded identity is only trusted while the browser is on an OSF page and still
+    has the session cookie (or lack of one) that was recorded with it, so that logging
+    in or out some other way (i.e. with the navbar) is noticed.
+    """
+    auth = getattr(driver, 'osf_auth', None)
+    if not auth or not driver.current_url.startswith(settings.OSF_HOME):
+        return UNKNOWN
+    cookie = driver.get_cookie(session_cookie_name())
+    if (cookie['value'] if cookie else None) != auth['cookie']:
+        return UNKNOWN
+    return auth['identity']
+
+
+def reset_driver(driver, keep_login=False):
+    """Return a driver to a clean, logged out state without a full logout or browser
+    restart: close extra windows, clear the OSF cookies and local storage and set the
+    cookie banner cookie again. With `keep_login` the cookies are kept.
+
+    Only the OSF origin is cleared in place (loading the lightweight robots.txt first
+    if the browser is somewhere else). CAS is only visited when the browser may have
+    logged in to CAS itself, so that its single sign-on cookie doesn't log the next
+    user in automatically.
+    """
+    close_extra_windows(driver)
+    goto_osf_origin(driver)
+    driver.execute_script('window.localStorage.clear(); window.sessionStorage.clear();')
+    if keep_login:
+        return
+    identity = get_identity(driver)
+    logged_in = driver.get_cookie(session_cookie_name()) is not None
+    driver.delete_all_cookies()
+    if logged_in and (identity == UNKNOWN or driver.osf_auth['cas']):
+        driver.get(settings.CAS_DOMAIN + '/logout')
+        driver.delete_all_cookies()
+    set_cookie_consent(driver)
+    set_identity(driver, ANONYMOUS, cas=False)
+
+
+def is_alive(driver):
+    """Return whether the browser still responds and has a window open."""
+    try:
+        return bool(driver.window_handles)
+    except WebDriverException:
+        return False
+
+
+class DriverPool:
+    """A pool of browsers that are launched in the background ahead of time and leased
+    out to tests, so that browser startup stays off the critical path.
+
+    Drivers are reset with `reset_driver` when they are returned, and a driver that
+    can no longer be reset, or that is found dead when it is leased (e.g. the browser
+    crashed), is replaced with a new one. The driver that was returned last is leased
+    first, so the spare drivers are only used when it can't be.
+    """
+
+    def __init__(self, size=1, launcher=launch_driver):
+        self.size = size
+        self.launcher = launcher
+        self.drivers = []
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=size)
+        for _ in range(size):
+            self._launch()
+
+    def _launch(self):
+        self._executor.submit(self._warm_up)
+
+    def _warm_up(self):
+        try:
+            driver = self.launcher()
+            with self._lock:
+                self.drivers.append(driver)
+            reset_driver(driver)
+        except Exception as exc:
+            # Handed to whoever acquires next so that the error isn't lost
+            self._idle.put(exc)
+        else:
+            self._idle.put(driver)
+
+    def acquire(self, timeout=None):
+        """Lease a driver, waiting for one to finish launching if none are idle."""
+        while True:
+            driver = self._idle.get(timeout=timeout)
+            if isinstance(driver, Exception):
+                raise driver
+            if is_alive(driver):
+                return driver
+            self._discard(driver)
+            self._launch()
+
+    def release(self, driver, reset=True, keep_login=False):
+        """Return a leased driver to the pool, reset with `reset_driver`."""
+        if reset:
+            try:
+                reset_driver(driver, keep_login=keep_login)
+            except WebDriverException:
+                self._discard(driver)
+                self._launch()
+                return
+        self._idle.put(driver)
+
+    def _discard(self, driver):
+        with self._lock:
+            self.drivers.remove(driver)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def close(self):
+        """Quit every driver in the pool, including those still launching."""
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            drivers, self.drivers = self.drivers, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+
+
 def find_current_browser(driver):
     current_browser = driver.desired_capabilities.get('browserName')
     return current_browser
@@ -183,23 +403,129 @@ def get_guid_from_url(url, itemno):
     return guid
 
 
+# Returns the cells of up to `limit` rows (`/tbody/tr`, starting at `offset`) of the
+# table found by xpath, or null if there is no such table. Each cell (`/td`) is its
+# text, or an object with its text, the requested attributes and the hrefs of its links.
+TABLE_DATA_SCRIPT = """
+var tablePath = arguments[0], offset = arguments[1], limit = arguments[2],
+    attributes = arguments[3], includeLinks = arguments[4];
+var table = document.evaluate(
+    tablePath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+).singleNodeValue;
+if (!table) {
+    return null;
+}
+var children = function (node, tagName) {
+    return Array.prototype.filter.call(node.children, function (child) {
+        return child.tagName === tagName;
+    });
+};
+var rows = [];
+children(table, 'TBODY').forEach(function (tbody) {
+    rows = rows.concat(children(tbody, 'TR'));
+});
+var end = limit === null ? rows.length : Math.min(rows.length, offset + limit);
+var data = [];
+for (var i = offset; i < end; i++) {
+    data.push(children(rows[i], 'TD').map(function (cell) {
+        var text = cell.innerText.trim();
+        if (!attributes.length && !includeLinks) {
+            return text;
+        }
+        var values = {};
+        attributes.forEach(function (name) {
+            values[name] = cell.getAttribute(name);
+        });
+        var links = Array.prototype.map.call(
+            cell.querySelectorAll('a[href]'), function (link) { return link.href; }
+        );
+        return {text: text, attributes: values, links: links};
+    }));
+}
+return {rows: data, total: rows.length};
+"""
+
+
+class TableData:
+    """The cells of an html table, read by `read_table`.
+
+    `rows` is a list of rows, each a list of cells. A cell is its text, or if
+    attributes or links were requested, a dictionary with `text`, `attributes`
+    and `links` keys.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def columns(self):
+        """List of columns, each a list of cells. Short rows are padded with None."""
+        width = max((len(row) for row in self.rows), default=0)
+        return [
+            [row[i] if i < len(row) else None for row in self.rows]
+            for i in range(width)
+        ]
+
+    @property
+    def texts(self):
+        """The text of every cell, row by row."""
+        return [
+            cell['text'] if isinstance(cell, dict) else cell
+            for row in self.rows
+            for cell in row
+        ]
+
+
+def _fetch_table_rows(driver, table_path, offset, limit, attributes, include_links):
+    data = driver.execute_script(
+        TABLE_DATA_SCRIPT, table_path, offset, limit, attributes or [], include_links
+    )
+    if data is None:
+        raise NoSuchElementException('No table found at {}'.format(table_path))
+    return data
+
+
+def read_table(driver, table_path, attributes=None, include_links=False):
+    """Read all of the cells of the table at the `table_path` xpath in a single
+    WebDriver call. See `TableData`.
+    """
+    data = _fetch_table_rows(driver, table_path, 0, None, attributes, include_links)
+    return TableData(data['rows'])
+
+
+def iter_table_rows(
+    driver, table_path, batch_size=50, attributes=None, include_links=False
+):
+    """Yield the rows of the table at the `table_path` xpath one at a time, fetching
+    `batch_size` rows per WebDriver call. Stops fetching as soon as the caller stops
+    iterating, so very large tables don't have to be read in full.
+    """
+    offset = 0
+    while True:
+        data = _fetch_table_rows(
+            driver, table_path, offset, batch_size, attributes, include_links
+        )
+        yield from data['rows']
+        offset += len(data['rows'])
+        if not data['rows'] or offset >= data['total']:
+            return
+
+
 def read_data_from_table(driver, table_path, check_match, item_match=None):
+    """Return the number of rows in the table at the `table_path` xpath and the text
+    of its cells. If `check_match` is set, stop at the first cell containing
+    `item_match` and return its (1-based) row number and the cells read so far instead.
+    """
     datalist = []
-    table_data = driver.find_element_by_xpath(table_path)
-    path1 = table_path + '/tbody/tr'
-    rows = table_data.find_elements_by_xpath(path1)
-    rlen = len(rows)
-
-    for i in range(1, rlen + 1):
-        path2 = path1 + '[' + str(i) + ']/td'
-        items = driver.find_elements_by_xpath(path2)
-        clen = len(items)
-        for j in range(1, clen + 1):
-            path3 = path2 + '[' + str(j) + ']'
-            cell_data = driver.find_element_by_xpath(path3).text
+    rlen = 0
+    for rlen, row in enumerate(iter_table_rows(driver, table_path), start=1):
+        for cell_data in row:
             datalist.append(cell_data)
             if check_match:
                 if item_match in cell_data:
-                    return i, datalist
+                    return rlen, datalist
 
     return rlen, datalist